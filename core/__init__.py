@@ -3,142 +3,369 @@ __version__ = '1.1.5'
 
 import frappe
 from frappe import _
+from frappe.permissions import get_role_permissions
 import json
+import hashlib
 from datetime import datetime
 import re
-from frappe.utils import now_datetime
+from core.utils import profile, get_counter, bump_counter, not_modified
+from core.series import next_names
 
 @frappe.whitelist()
+@profile()
 def get_roles(module=None):
     user = frappe.session.user
 
-    # Get all roles of the current session user
-    user_roles = frappe.get_roles(user)
+    # Get all roles of the current session user, with the hash of their role set
+    role_set, user_roles = _user_role_set(user)
 
     if module:
         module = module.strip().lower()
-        normalized_roles = [role.lower() for role in user_roles]
-
-        def has_role(role_name):
-            return int(role_name in normalized_roles)
-
-        role_flags = {
-            "employee": has_role("employee"),
-            "project_lead": has_role("project lead"),
-            "proxy_project_lead": has_role("proxy project lead"),
-            "department_lead": has_role("department lead"),
-            "proxy_department_lead": has_role("proxy department lead"),
-            f"{module}_fl": has_role(f"{module} fl"),
-            f"{module}_pfl": has_role(f"{module} pfl"),
-            f"{module}_admin": has_role(f"{module} admin"),
-            "super_admin": has_role("super admin"),
-        }
 
-        # New: if asking about the Fleet module, expose is_vehicle
-        if module == "fleet":
-            role_flags["is_vehicle"] = has_role("vehicle")
+        # Flags only depend on the roles, so users sharing a role set share the entry
+        cache = frappe.cache()
+        cache_key = f"role_flags:{role_set}:{module}"
+        role_flags = cache.get_value(cache_key)
+        if role_flags is None:
+            role_flags = _module_role_flags(user_roles, module)
+            cache.set_value(cache_key, role_flags, expires_in_sec=PERMISSION_CACHE_TTL)
 
         return role_flags
 
-    # Fetch employee details
-    employee_info = frappe.db.get_value(
-        "Employee",
-        {"user_id": user},
-        ["employee_name", "department", "date_of_birth", "date_of_joining"],
-        as_dict=True
-    ) or {}
-
-    # Fetch user info
-    user_info = frappe.db.get_value(
-        "User",
-        user,
-        ["desk_theme", "user_image"],
-        as_dict=True
-    ) or {}
-
-    # Get today's date
-    today = datetime.today().date()
+    return _user_summary(user, user_roles)
+
+@frappe.whitelist()
+@profile()
+def get_module_roles():
+    """
+    Role flags of the current user for every ERP product, keyed by lower-cased module
+    name. Each entry matches what `get_roles(module=...)` returns for that module.
+    """
+    role_set, user_roles = _user_role_set(frappe.session.user)
+
+    cache = frappe.cache()
+    cache_key = f"module_role_matrix:{role_set}:{get_counter(MODULES_VERSION_KEY)}"
+
+    matrix = cache.get_value(cache_key)
+    if matrix is None:
+        matrix = {module: _module_role_flags(user_roles, module) for module in _erp_modules()}
+        cache.set_value(cache_key, matrix, expires_in_sec=PERMISSION_CACHE_TTL)
+
+    return matrix
 
-    # Check for birthday and anniversary
-    dob = employee_info.get("date_of_birth")
-    doj = employee_info.get("date_of_joining")
-    is_birthday = dob and dob.month == today.month and dob.day == today.day
-    is_anniversary = doj and doj.month == today.month and doj.day == today.day
+MODULES_VERSION_KEY = "erp_modules_version"
+
+def _erp_modules():
+    """Lower-cased module names of all AGK_ERP_Products."""
+    cache = frappe.cache()
+    cache_key = f"erp_modules:{get_counter(MODULES_VERSION_KEY)}"
+
+    modules = cache.get_value(cache_key)
+    if modules is None:
+        modules = sorted({
+            name.strip().lower()
+            for name in frappe.get_all("AGK_ERP_Products", pluck="module_name")
+            if name
+        })
+        cache.set_value(cache_key, modules, expires_in_sec=PERMISSION_CACHE_TTL)
+
+    return modules
+
+def clear_module_cache(doc, method=None):
+    """AGK_ERP_Products hook: move module caches to a new version after commit."""
+    frappe.db.after_commit.add(lambda: bump_counter(MODULES_VERSION_KEY))
+
+@frappe.whitelist()
+@profile()
+def bootstrap():
+    """
+    Everything the desk needs on startup in one call: roles, employee profile,
+    theme, birthday/anniversary flags and the desk configuration.
+    """
+    user = frappe.session.user
+    _, user_roles = _user_role_set(user)
+
+    return {
+        **_user_summary(user, user_roles),
+        "desk": _desk_data()
+    }
+
+def _user_summary(user, user_roles):
+    session_profile = _session_profile(user)
+    celebrations = _celebrations()
 
     return {
         "roles": user_roles,
-        "employee_name": employee_info.get("employee_name"),
-        "department": employee_info.get("department"),
-        "desk_theme": user_info.get("desk_theme"),
-        "user_image": user_info.get("user_image"),
-        "is_birthday": is_birthday,
-        "is_anniversary": is_anniversary,
+        "employee_name": session_profile.get("employee_name"),
+        "department": session_profile.get("department"),
+        "desk_theme": session_profile.get("desk_theme"),
+        "user_image": session_profile.get("user_image"),
+        "is_birthday": user in celebrations["birthdays"],
+        "is_anniversary": user in celebrations["anniversaries"],
     }
 
+def _session_profile(user):
+    """Employee and User fields shown on the desk, cached until either record changes."""
+    cache = frappe.cache()
+    cache_key = f"session_profile:{user}"
+
+    session_profile = cache.get_value(cache_key)
+    if session_profile is None:
+        # Fetch employee details
+        employee_info = frappe.db.get_value(
+            "Employee",
+            {"user_id": user},
+            ["employee_name", "department"],
+            as_dict=True
+        ) or {}
+
+        # Fetch user info
+        user_info = frappe.db.get_value(
+            "User",
+            user,
+            ["desk_theme", "user_image"],
+            as_dict=True
+        ) or {}
+
+        session_profile = {**employee_info, **user_info}
+        cache.set_value(cache_key, session_profile, expires_in_sec=PERMISSION_CACHE_TTL)
+
+    return session_profile
+
+def _celebrations():
+    """Users whose birthday or work anniversary is today, computed once a day."""
+    cache = frappe.cache()
+    today = datetime.today().date()
+    cache_key = f"celebrations:{today.isoformat()}"
+
+    celebrations = cache.get_value(cache_key)
+    if celebrations is None:
+        rows = frappe.db.sql("""
+            SELECT user_id,
+                (MONTH(date_of_birth) = %(month)s AND DAY(date_of_birth) = %(day)s) AS is_birthday,
+                (MONTH(date_of_joining) = %(month)s AND DAY(date_of_joining) = %(day)s) AS is_anniversary
+            FROM `tabEmployee`
+            WHERE user_id IS NOT NULL
+            AND (
+                (MONTH(date_of_birth) = %(month)s AND DAY(date_of_birth) = %(day)s)
+                OR (MONTH(date_of_joining) = %(month)s AND DAY(date_of_joining) = %(day)s)
+            )
+        """, {"month": today.month, "day": today.day}, as_dict=1)
+
+        celebrations = {
+            "birthdays": {row.user_id for row in rows if row.is_birthday},
+            "anniversaries": {row.user_id for row in rows if row.is_anniversary}
+        }
+        cache.set_value(cache_key, celebrations, expires_in_sec=PERMISSION_CACHE_TTL)
+
+    return celebrations
+
+def clear_session_cache(doc, method=None):
+    """Employee / User hook: drop the cached desk profile and today's celebrations."""
+    users = {doc.name} if doc.doctype == "User" else {doc.get("user_id")}
+    old_doc = doc.get_doc_before_save()
+    if doc.doctype == "Employee" and old_doc:
+        users.add(old_doc.get("user_id"))
+
+    def clear():
+        cache = frappe.cache()
+        for user in filter(None, users):
+            cache.delete_value(f"session_profile:{user}")
+        if doc.doctype == "Employee":
+            cache.delete_value(f"celebrations:{datetime.today().date().isoformat()}")
+
+    frappe.db.after_commit.add(clear)
+
+DESK_CACHE_KEY = "desk_settings_cache"
+DESK_VERSION_KEY = "desk_settings_version"
+
+# Parsed Desk Settings of this worker per site as (version, data), shared read-only by
+# the site's requests. Workers serve every site of the bench, so entries are keyed by site.
+_desk_settings = {}
+
 @frappe.whitelist()
+@profile()
 def get_desk_data():
-    cache_key = "desk_settings_cache"
-    cached_data = frappe.cache().get_value(cache_key)
+    version = get_counter(DESK_VERSION_KEY)
 
-    if cached_data:
-        return json.loads(cached_data)
+    # The browser already has this configuration, skip the download
+    if not_modified(f'"desk-{version}"'):
+        return
 
-    # Fetch Desk Settings and cache it
-    config_doc = frappe.get_single("Desk Settings")
-    config_data = config_doc.configuration or "{}"
+    return _desk_data(version)
 
-    frappe.cache().set_value(cache_key, config_data)
-    return json.loads(config_data)
+def _desk_data(version=None):
+    """
+    Parsed Desk Settings configuration. Workers keep the parsed object in memory and
+    only go back to Redis (and the database on a miss) when the version changes.
+    """
+    if version is None:
+        version = get_counter(DESK_VERSION_KEY)
+
+    cached = _desk_settings.get(frappe.local.site)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    config_data = frappe.cache().get_value(DESK_CACHE_KEY)
+    if not config_data:
+        # Fetch Desk Settings and cache it
+        config_doc = frappe.get_single("Desk Settings")
+        config_data = config_doc.configuration or "{}"
+        frappe.cache().set_value(DESK_CACHE_KEY, config_data)
+
+    data = json.loads(config_data)
+    _desk_settings[frappe.local.site] = (version, data)
+    return data
 
 def update_desk_cache(self, *args, **kwargs):
-    cache_key = "desk_settings_cache"
-    config_doc = frappe.get_single("Desk Settings")
-    config_data = config_doc.configuration or "{}"
-    frappe.cache().set_value(cache_key, config_data)
+    config_data = self.configuration or "{}"
 
+    def refresh():
+        # Store the new blob before bumping the version workers compare against
+        frappe.cache().set_value(DESK_CACHE_KEY, config_data)
+        bump_counter(DESK_VERSION_KEY)
 
-def _cache_key(user):
-    return f"doctype_list:{user}"
+    frappe.db.after_commit.add(refresh)
 
-@frappe.whitelist()
 
+PERMISSION_GENERATION_KEY = "doctype_perm_generation"
+
+# Stale generations are never read again, they just expire
+PERMISSION_CACHE_TTL = 24 * 60 * 60
+
+def _role_set_hash(roles):
+    return hashlib.sha1("\n".join(sorted(set(roles))).encode()).hexdigest()
+
+def _user_role_set(user):
+    """(role-set hash, roles) of a user, cached until their Has Role rows or User change."""
+    cache = frappe.cache()
+    user_generation = get_counter(f"{PERMISSION_GENERATION_KEY}:{user}")
+    cache_key = f"user_role_set:{user}:{user_generation}"
+
+    role_set = cache.get_value(cache_key)
+    if role_set is None:
+        roles = frappe.get_roles(user)
+        role_set = (_role_set_hash(roles), roles)
+        cache.set_value(cache_key, role_set, expires_in_sec=PERMISSION_CACHE_TTL)
+
+    return role_set
+
+def _module_role_flags(roles, module):
+    normalized_roles = {role.lower() for role in roles}
+
+    def has_role(role_name):
+        return int(role_name in normalized_roles)
+
+    role_flags = {
+        "employee": has_role("employee"),
+        "project_lead": has_role("project lead"),
+        "proxy_project_lead": has_role("proxy project lead"),
+        "department_lead": has_role("department lead"),
+        "proxy_department_lead": has_role("proxy department lead"),
+        f"{module}_fl": has_role(f"{module} fl"),
+        f"{module}_pfl": has_role(f"{module} pfl"),
+        f"{module}_admin": has_role(f"{module} admin"),
+        "super_admin": has_role("super admin"),
+    }
+
+    # New: if asking about the Fleet module, expose is_vehicle
+    if module == "fleet":
+        role_flags["is_vehicle"] = has_role("vehicle")
+
+    return role_flags
+
+# Longest prefix stored in the doctype search index, longer queries are verified
+DOCTYPE_PREFIX_LENGTH = 3
+
+@frappe.whitelist()
+@profile()
 def search(txt=None, limit=20):
-    
+
     user = frappe.session.user
+    index = _doctype_index(user)
+
+    return [{"name": dt} for dt in _search_doctype_index(index, txt, int(limit))]
+
+def _doctype_index(user):
+    """
+    Search index of the non-table doctypes the user's roles can read. Only role
+    permissions are used (not documents shared with the user), so the index is
+    computed and cached once per distinct role set.
+    """
     cache = frappe.cache()
-    cache_key = _cache_key(user)
+    role_set, _ = _user_role_set(user)
+    generation = get_counter(PERMISSION_GENERATION_KEY)
+    cache_key = f"doctype_index:{generation}:{role_set}"
 
-    permitted = cache.get_value(cache_key)
-    if permitted is None:
+    index = cache.get_value(cache_key)
+    if index is None:
         all_dts = frappe.get_all(
             "DocType", filters={"istable": 0}, pluck="name"
         )
-        permitted = [dt for dt in all_dts if frappe.has_permission(dt)]
-        cache.set_value(cache_key, permitted)
-
-    txt_lower = (txt or "").lower()
-    result = []
-    for dt in permitted:
-        if not txt_lower or txt_lower in dt.lower():
-            result.append({"name": dt})
-            if len(result) >= int(limit):
-                break
-
-    return result
+        index = _build_doctype_index([
+            dt for dt in all_dts
+            if get_role_permissions(frappe.get_meta(dt), user).get("read")
+        ])
+        cache.set_value(cache_key, index, expires_in_sec=PERMISSION_CACHE_TTL)
+
+    return index
+
+def _build_doctype_index(doctypes):
+    """Pre-lowercased doctype names with a prefix index over the name and its words."""
+    lowered = [dt.lower() for dt in doctypes]
+    prefixes = {}
+    for position, name in enumerate(lowered):
+        keys = set()
+        for word in [name, *re.split(r"[\s_\-]+", name)]:
+            keys.update(word[:size] for size in range(1, min(len(word), DOCTYPE_PREFIX_LENGTH) + 1))
+        for key in keys:
+            prefixes.setdefault(key, []).append(position)
+
+    return {"names": doctypes, "lower": lowered, "prefixes": prefixes}
+
+def _search_doctype_index(index, txt, limit):
+    """Rank exact, prefix, word prefix and then substring matches."""
+    names, lowered = index["names"], index["lower"]
+    query = (txt or "").strip().lower()
+    if not query:
+        return names[:limit]
+
+    ranked = {}
+    for position in index["prefixes"].get(query[:DOCTYPE_PREFIX_LENGTH], []):
+        name = lowered[position]
+        if name == query:
+            ranked[position] = 0
+        elif name.startswith(query):
+            ranked[position] = 1
+        elif any(word.startswith(query) for word in re.split(r"[\s_\-]+", name)):
+            ranked[position] = 2
+
+    # Plain substring matches only fill up what the prefix index did not
+    if len(ranked) < limit:
+        for position, name in enumerate(lowered):
+            if position not in ranked and query in name:
+                ranked[position] = 3
+                if len(ranked) >= limit:
+                    break
+
+    order = sorted(ranked, key=lambda position: (ranked[position], len(lowered[position]), position))
+    return [names[position] for position in order[:limit]]
 
 def invalidate_user_cache(doc, method):
-
-    cache = frappe.cache()
-
+    """
+    Move permission caches to a new generation once the change is committed.
+    Has Role and User (roles edited on the form, add_roles / remove_roles) bump the
+    user's generation (remapping them to a role set), DocPerm / Custom DocPerm the
+    global one (recomputing each role set once).
+    """
     if doc.doctype == "Has Role":
-        user = doc.parent
-        cache.delete_value(_cache_key(user))
-    elif doc.doctype == "DocPerm":
-        users = frappe.get_all(
-            "User", filters={"enabled": 1, "user_type": "System User"}, pluck="name"
-        )
-        for user in users:
-            cache.delete_value(_cache_key(user))
+        counter = f"{PERMISSION_GENERATION_KEY}:{doc.parent}"
+    elif doc.doctype == "User":
+        counter = f"{PERMISSION_GENERATION_KEY}:{doc.name}"
+    else:
+        counter = PERMISSION_GENERATION_KEY
+
+    frappe.db.after_commit.add(lambda: bump_counter(counter))
 
 def custom_name(self, series_format: str):
     # Only run for new documents
@@ -153,32 +380,5 @@ def custom_name(self, series_format: str):
     - MMYY is automatically replaced based on current date.
     """
 
-    current_date = now_datetime()
-    mmyy = current_date.strftime("%m%y")
-    series_prefix = series_format.replace("MMYY", mmyy)
-
-    match = re.match(r"(.+?)_#+$", series_prefix)
-    if not match:
-        frappe.throw("Invalid series format. Use format like 'PV_MMYY_####'.")
-
-    prefix = match.group(1)
-    hash_count = series_prefix.count("#")
-    like_pattern = f"{prefix}_%"
-
-    last_name = frappe.db.get_value(
-        self.doctype,
-        filters={"name": ["like", like_pattern]},
-        fieldname="name",
-        order_by="creation desc"
-    )
-
-    if last_name and last_name.startswith(prefix):
-        last_counter_str = last_name.replace(f"{prefix}_", "")
-        last_counter = int(last_counter_str) if last_counter_str.isdigit() else 0
-    else:
-        last_counter = 0
-
-    new_counter = last_counter + 1
-    padded_counter = str(new_counter).zfill(hash_count)
-
-    self.name = f"{prefix}_{padded_counter}"
+    # One atomic counter per (doctype, prefix, month) instead of scanning the last name
+    self.name = next_names(self.doctype, series_format)[0]
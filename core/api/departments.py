@@ -1,7 +1,9 @@
 import frappe
 from frappe import _
+from core.utils import profile, get_approver_directory
 
 @frappe.whitelist()
+@profile()
 def list():
     
     try:
@@ -18,22 +20,21 @@ def list():
         frappe.throw(_("An error occurred while fetching rigs: {0}").format(str(e)))
 
 @frappe.whitelist()
+@profile()
 def approvers(department_name):
     try:
-        # Fetch the department details matching the given department_name
-        department = frappe.get_value(
-            "AGK_Departments",
-            {"department_name": department_name},
-            ["primary_approver", "proxy_approver"],
-            as_dict=True
-        )
+        # Fetch the department approvers from the approver directory
+        department = get_approver_directory()["departments"].get(department_name)
 
         # If no department is found, raise an error
         if not department:
             frappe.throw(_("No department found with the name: {0}").format(department_name))
 
         # Return the approvers' details
-        return department
+        return {
+            "primary_approver": department[0],
+            "proxy_approver": department[1]
+        }
     except Exception as e:
         # Handle exceptions and return an error response
         frappe.throw(_("An error occurred while fetching approvers: {0}").format(str(e)))
@@ -1,19 +1,74 @@
 import frappe
-from frappe.utils import nowdate
+from frappe.utils import cint, now
+from frappe.sessions import clear_sessions
+
+# (doctype, field, label, role) of every place a user can be an approver,
+# in the order the checks are reported
+APPROVER_FIELDS = [
+    ("AGK_ERP_Products", "primary_fl", "ERP Products", "primary"),
+    ("AGK_ERP_Products", "proxy_fl", "ERP Products", "proxy"),
+    ("AGK_Departments", "primary_approver", "Departments", "primary"),
+    ("AGK_Departments", "proxy_approver", "Departments", "proxy"),
+    ("AGK_Projects", "primary_approver", "Projects", "primary"),
+    ("AGK_Projects", "proxy_approver", "Projects", "proxy"),
+]
+
+def get_approver_references(users):
+    """
+    Where the given users are referenced as approvers, with one UNION query.
+    Returns {user: [(label, role, [document names]), ...]} in APPROVER_FIELDS order.
+    """
+    users = tuple(set(filter(None, users)))
+    if not users:
+        return {}
+
+    query = "\nUNION ALL\n".join(
+        f"SELECT {position} AS position, `{field}` AS user, name FROM `tab{doctype}` WHERE `{field}` IN %(users)s"
+        for position, (doctype, field, label, role) in enumerate(APPROVER_FIELDS)
+    )
+    rows = frappe.db.sql(query, {"users": users}, as_dict=True)
+
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row.user, {}).setdefault(row.position, []).append(row.name)
+
+    return {
+        user: [
+            (APPROVER_FIELDS[position][2], APPROVER_FIELDS[position][3], names)
+            for position, names in sorted(positions.items())
+        ]
+        for user, positions in grouped.items()
+    }
+
+def new_user(employee):
+    """User document created for an Employee's company email."""
+    return {
+        "doctype": "User",
+        "email": employee.company_email,
+        "full_name": employee.employee_name,
+        "first_name": employee.first_name,
+        "user_image": employee.image,
+        "birth_date": employee.date_of_birth,
+        "enabled": 1,
+        "send_welcome_email": 0,
+        "new_password": "Agn1kul!"
+    }
 
 def before_validate(doc, method):
     """
     This function is triggered before validating the Employee document.
     Enables the User if the Employee status is Active and the User is disabled.
     Checks for active approver roles before potentially disabling the User.
+    The approver check also runs for bulk imports, only the User sync is left to
+    `bulk_sync_users`.
     """
     if doc.user_id:
         # First, handle User enabling for Active status
-        if doc.status == "Active":
+        if doc.status == "Active" and not frappe.flags.bulk_employee_sync:
             try:
-                user = frappe.get_doc("User", doc.user_id)
-                if not user.enabled:
+                if not frappe.db.get_value("User", doc.user_id, "enabled"):
                     # Attempt to enable the user
+                    user = frappe.get_doc("User", doc.user_id)
                     user.enabled = 1
                     user.save(ignore_permissions=True)
                     frappe.msgprint(f"User {doc.user_id} has been enabled.")
@@ -23,82 +78,22 @@ def before_validate(doc, method):
 
         # Then check for approver roles when trying to change status to non-Active
         if doc.status != "Active":
-            # Check email in AGK_ERP_Products
-            products = frappe.get_all('AGK_ERP_Products', 
-                filters=[
-                    ['primary_fl', '=', doc.user_id]
-                ],
-                fields=['name']
-            )
-            if products:
-                frappe.throw(f"Cannot change Employee status. User is a primary approver in ERP Products: {', '.join([p['name'] for p in products])}")
-
-            products = frappe.get_all('AGK_ERP_Products', 
-                filters=[
-                    ['proxy_fl', '=', doc.user_id]
-                ],
-                fields=['name']
-            )
-            if products:
-                frappe.throw(f"Cannot change Employee status. User is a proxy approver in ERP Products: {', '.join([p['name'] for p in products])}")
-
-            # Check in AGK_Departments
-            departments = frappe.get_all('AGK_Departments', 
-                filters=[
-                    ['primary_approver', '=', doc.user_id]
-                ],
-                fields=['name']
-            )
-            if departments:
-                frappe.throw(f"Cannot change Employee status. User is a primary approver in Departments: {', '.join([d['name'] for d in departments])}")
-
-            departments = frappe.get_all('AGK_Departments', 
-                filters=[
-                    ['proxy_approver', '=', doc.user_id]
-                ],
-                fields=['name']
-            )
-            if departments:
-                frappe.throw(f"Cannot change Employee status. User is a proxy approver in Departments: {', '.join([d['name'] for d in departments])}")
-
-            # Check in AGK_Projects
-            projects = frappe.get_all('AGK_Projects', 
-                filters=[
-                    ['primary_approver', '=', doc.user_id]
-                ],
-                fields=['name']
-            )
-            if projects:
-                frappe.throw(f"Cannot change Employee status. User is a primary approver in Projects: {', '.join([p['name'] for p in projects])}")
-
-            projects = frappe.get_all('AGK_Projects', 
-                filters=[
-                    ['proxy_approver', '=', doc.user_id]
-                ],
-                fields=['name']
-            )
-            if projects:
-                frappe.throw(f"Cannot change Employee status. User is a proxy approver in Projects: {', '.join([p['name'] for p in projects])}")
+            references = get_approver_references([doc.user_id]).get(doc.user_id)
+            if references:
+                label, role, names = references[0]
+                frappe.throw(f"Cannot change Employee status. User is a {role} approver in {label}: {', '.join(names)}")
 
 def before_save(doc, method):
-    
+    if frappe.flags.bulk_employee_sync:
+        return
+
     if doc.company_email:
         try:
             # Check if a User document already exists
             user_exists = frappe.db.exists("User", {"email": doc.company_email})
             if not user_exists:
                 # Create a new User document
-                user = frappe.get_doc({
-                    "doctype": "User",
-                    "email": doc.company_email,
-                    "full_name": doc.employee_name,
-                    "first_name": doc.first_name,
-                    "user_image": doc.image,
-                    "birth_date": doc.date_of_birth,
-                    "enabled": 1,
-                    "send_welcome_email": 0,
-                    "new_password": "Agn1kul!"
-                })
+                user = frappe.get_doc(new_user(doc))
                 user.insert(ignore_permissions=True)
                 frappe.msgprint(f"User {doc.company_email} has been created.")
                 
@@ -130,15 +125,149 @@ def validate_user_status(doc, method):
     This function is triggered during validation of the Employee document.
     Ensures User status is synchronized with Employee status.
     """
+    if frappe.flags.bulk_employee_sync:
+        return
+
     if doc.user_id:
         try:
-            # Get the current User document
-            user = frappe.get_doc("User", doc.user_id)
-            
-            # Ensure User status matches Employee status
-            user.enabled = 1 if doc.status == "Active" else 0
-            user.save(ignore_permissions=True)
-        
+            enabled = frappe.db.get_value("User", doc.user_id, "enabled")
+            if enabled is None:
+                raise frappe.DoesNotExistError(f"User {doc.user_id} not found")
+
+            # Ensure User status matches Employee status, only saving when it differs
+            status = 1 if doc.status == "Active" else 0
+            if cint(enabled) != status:
+                user = frappe.get_doc("User", doc.user_id)
+                user.enabled = status
+                user.save(ignore_permissions=True)
+
         except Exception as e:
             frappe.log_error(f"Error updating user status for Employee {doc.name}: {str(e)}")
             frappe.throw(f"Could not update user status: {str(e)}")
+
+def validate_bulk_status(rows, status):
+    """Employee controller status rules for the raw status UPDATE of `bulk_sync_users`."""
+    options = frappe.get_meta("Employee").get_options("status").split("\n")
+    if status not in options:
+        frappe.throw(f"Invalid Employee status {status}. Must be one of: {', '.join(options)}")
+
+    if status != "Left":
+        return
+
+    missing = [row.name for row in rows if not row.relieving_date]
+    if missing:
+        frappe.throw(f"Please enter relieving date for: {', '.join(missing)}")
+
+    # Active employees outside the batch cannot keep reporting to someone who left
+    names = [row.name for row in rows]
+    reports = frappe.get_all(
+        "Employee",
+        filters={"reports_to": ["in", names], "status": "Active", "name": ["not in", names]},
+        fields=["name", "reports_to"]
+    ) if names else []
+    if reports:
+        frappe.throw("Employees still report to: " + "; ".join(
+            f"{row.name} reports to {row.reports_to}" for row in reports
+        ))
+
+@frappe.whitelist()
+def bulk_sync_users(employees, status=None):
+    """
+    Onboard or offboard a batch of Employees with set-based User updates and one commit.
+
+    - `employees`: list of Employee names.
+    - `status`: optional Employee status to set on all of them first.
+
+    Applies the same rules as the Employee hooks: Users are created for company emails
+    without one, User.enabled follows the Employee status, PushNotify Users of inactive
+    employees are removed and approvers cannot be made inactive. `status` is checked
+    against the Employee status options, and "Left" needs a relieving date and no active
+    direct reports, as the Employee controller requires. Imports can insert Employees
+    with `frappe.flags.bulk_employee_sync` set to skip the per-row User sync and call
+    this once per batch instead.
+
+    Missing Users are still inserted one by one through the User controller, which sets
+    the password, user type and default roles; only the updates are set-based.
+    """
+    frappe.only_for(["HR Manager", "System Manager"])
+
+    names = frappe.parse_json(employees) or []
+    rows = frappe.get_all(
+        "Employee",
+        filters={"name": ["in", names]},
+        fields=["name", "employee_name", "first_name", "company_email", "user_id",
+                "status", "image", "date_of_birth", "relieving_date"]
+    )
+    if status:
+        validate_bulk_status(rows, status)
+        for row in rows:
+            row.status = status
+
+    # Approvers cannot be made inactive, checked for the whole batch at once
+    references = get_approver_references(row.user_id for row in rows if row.status != "Active")
+    if references:
+        frappe.throw("Cannot change Employee status. " + "; ".join(
+            f"{user} is a {role} approver in {label}: {', '.join(docs)}"
+            for user, user_references in references.items()
+            for label, role, docs in user_references
+        ))
+
+    # Create the missing Users, looked up in one query. User names and emails are
+    # stored lower-cased, so compare lower-cased company emails
+    emails = list({row.company_email.lower() for row in rows if row.company_email})
+    existing = {email.lower() for email in frappe.get_all("User", filters={"email": ["in", emails]}, pluck="email")} if emails else set()
+    created, user_ids = [], {}
+    for row in rows:
+        email = (row.company_email or "").lower()
+        if email and email not in existing:
+            user = frappe.get_doc(new_user(row)).insert(ignore_permissions=True)
+            existing.add(email)
+            created.append(user.name)
+            row.user_id = user_ids[row.name] = user.name
+
+    if status and rows:
+        frappe.db.sql("""
+            UPDATE `tabEmployee` SET status = %(status)s, modified = %(now)s, modified_by = %(user)s
+            WHERE name IN %(names)s
+        """, {"status": status, "now": now(), "user": frappe.session.user, "names": tuple(row.name for row in rows)})
+
+    if user_ids:
+        frappe.db.bulk_update(
+            "Employee", {name: {"user_id": user_id} for name, user_id in user_ids.items()}, update_modified=False
+        )
+
+    # Sync User.enabled with the Employee status, only touching Users that differ.
+    # Keyed lower-cased, as user_id may not match the User name's case
+    target = {row.user_id.lower(): 1 if row.status == "Active" else 0 for row in rows if row.user_id}
+    current = dict(frappe.get_all(
+        "User", filters={"name": ["in", list(target)]}, fields=["name", "enabled"], as_list=True
+    )) if target else {}
+    enable = [user for user, enabled in current.items() if target[user.lower()] and not cint(enabled)]
+    disable = [user for user, enabled in current.items() if not target[user.lower()] and cint(enabled)]
+
+    for users, enabled in ((enable, 1), (disable, 0)):
+        if users:
+            frappe.db.sql("""
+                UPDATE `tabUser` SET enabled = %(enabled)s, modified = %(now)s
+                WHERE name IN %(users)s
+            """, {"enabled": enabled, "now": now(), "users": tuple(users)})
+
+    # Remove PushNotify Users of everyone who is no longer active
+    inactive = [user for user, enabled in target.items() if not enabled]
+    if inactive and frappe.db.exists("DocType", "PushNotify User"):
+        frappe.db.delete("PushNotify User", {"name": ["in", inactive]})
+
+    frappe.db.commit()
+
+    # The SQL updates skip the User controller, so clear what its hooks would have
+    for user in enable + disable:
+        frappe.clear_cache(user=user)
+    for user in disable:
+        clear_sessions(user=user, force=True)
+
+    return {
+        "created": created,
+        "enabled": enable,
+        "disabled": disable,
+        "not_found": sorted(set(names) - {row.name for row in rows})
+    }
@@ -1,7 +1,10 @@
 import frappe
 from frappe import _, get_doc
+from core.utils import profile
+from core.series import next_codes
 
 @frappe.whitelist()
+@profile()
 def list():
     
     try:
@@ -24,17 +27,7 @@ def security(doc, method):
 
         # Automatically generate the facility_code
         if not doc.facility_code:
-            latest_code = frappe.db.sql("""
-                SELECT facility_code FROM `tabAGK_Facilities`
-                WHERE facility_code IS NOT NULL
-                ORDER BY facility_code DESC
-                LIMIT 1
-            """)
-            if latest_code:
-                next_code = "F" + str(int(latest_code[0][0][1:]) + 1).zfill(4)
-            else:
-                next_code = "F0001"
-            doc.facility_code = next_code
+            doc.facility_code = next_codes("facility_code")[0]
         if not doc.security_email or not doc.facility_name:
             frappe.throw(_("Missing required fields: security_email or facility_name"))
 
@@ -0,0 +1,151 @@
+import frappe
+from frappe import _
+from frappe.utils import cint
+from core.api.mis import get_mis_records
+from core.utils import profile, get_counter, not_modified
+
+VERSION_KEY = "master_data_version"
+
+# Section data is cached per version, entries of older versions just expire
+SECTION_CACHE_TTL = 5 * 60
+
+# Snapshot section -> doctype whose writes invalidate it
+SECTIONS = {
+    "projects": "AGK_Projects",
+    "rigs": "AGK_Rigs",
+    "facilities": "AGK_Facilities",
+    "departments": "AGK_Departments",
+    "mis": "AGK_MIS"
+}
+
+@frappe.whitelist()
+@profile()
+def snapshot(since=None):
+    """
+    All master data used by the desk in one versioned response.
+
+    - Sends an ETag; a matching If-None-Match gets a 304 with no body.
+    - With `since` (a version from an earlier response) only the sections
+      changed after that version are returned and `full` is 0.
+    """
+    try:
+        version = get_counter(VERSION_KEY)
+        if not_modified(f'"{version}"'):
+            return
+
+        section_versions = get_section_versions()
+        sections = [*SECTIONS]
+        full = 1
+        if since is not None and cint(since) <= version:
+            sections = [
+                section for section in SECTIONS
+                # Unknown section versions (e.g. after a cache flush) are sent again
+                if section_versions[section] is None or section_versions[section] > cint(since)
+            ]
+            full = 0
+
+        return {
+            "version": version,
+            "full": full,
+            "data": {
+                section: get_section(section, cache_version(section_versions[section], version))
+                for section in sections
+            }
+        }
+
+    except Exception as e:
+        frappe.throw(_("An error occurred while fetching master data: {0}").format(str(e)))
+
+def get_section(section, version=None):
+    """
+    Payload for one snapshot section, cached under the section's `version` (see
+    `cache_version`, read from Redis when not given). A request that read the database
+    before a write can only fill the entry of the version it started from, never the new one.
+    """
+    if version is None:
+        version = cache_version(get_section_versions()[section], get_counter(VERSION_KEY))
+
+    cache = frappe.cache()
+    cache_key = f"master_data:{section}:{version}"
+
+    data = cache.get_value(cache_key)
+    if data is None:
+        data = LOADERS[section]()
+        cache.set_value(cache_key, data, expires_in_sec=SECTION_CACHE_TTL)
+    return data
+
+def get_section_versions():
+    """Version at which each section last changed, None if unknown."""
+    cache = frappe.cache()
+    values = cache.mget([cache.make_key(f"{VERSION_KEY}:{section}") for section in SECTIONS])
+    return {
+        section: int(value) if value is not None else None
+        for section, value in zip(SECTIONS, values)
+    }
+
+def cache_version(section_version, global_version):
+    """Version a section's data is cached under: its own, or the global one when unknown."""
+    return section_version or f"global-{global_version}"
+
+def invalidate(doc, method=None):
+    """Doc event hook: bump the snapshot version once the write is committed."""
+    for section, doctype in SECTIONS.items():
+        if doctype == doc.doctype:
+            frappe.db.after_commit.add(lambda section=section: clear_section(section))
+
+def clear_section(section):
+    """
+    Publish a new global version and make it the section's version in one Redis
+    transaction, so no reader sees the new global version with the old section version.
+    """
+    get_counter(VERSION_KEY)
+    cache = frappe.cache()
+    version_key = cache.make_key(VERSION_KEY)
+    section_key = cache.make_key(f"{VERSION_KEY}:{section}")
+
+    def bump(pipe):
+        version = int(pipe.get(version_key)) + 1
+        pipe.multi()
+        pipe.set(version_key, version)
+        pipe.set(section_key, version)
+
+    # Retried when another write bumps the version in between
+    cache.transaction(bump, version_key)
+
+def load_projects():
+    return frappe.db.sql("""
+        SELECT pd.name1, pd.code, p.primary_approver as approver, p.proxy_approver,
+            p.name as project, p.project_name, p.indicator
+        FROM `tabAGK_Projects` p
+        INNER JOIN `tabProject Detail` pd ON pd.parent = p.name
+        WHERE p.status = 'Active'
+        ORDER BY pd.name1
+    """, as_dict=1)
+
+def load_rigs():
+    return frappe.get_all(
+        "AGK_Rigs",
+        filters={"status": "Active"},
+        fields=["rig_name", "rig_code"]
+    )
+
+def load_facilities():
+    return frappe.get_all(
+        "AGK_Facilities",
+        filters={"status": "Active"},
+        fields=["facility_name", "facility_code"]
+    )
+
+def load_departments():
+    return frappe.get_all(
+        "AGK_Departments",
+        fields=["department_name", "department_code", "primary_approver"]
+    )
+
+LOADERS = {
+    "projects": load_projects,
+    "rigs": load_rigs,
+    "facilities": load_facilities,
+    "departments": load_departments,
+    "mis": get_mis_records
+}
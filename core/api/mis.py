@@ -1,31 +1,72 @@
-from frappe import get_all, get_doc
-from frappe.utils.response import json_handler
 import frappe
-import json
+from frappe.utils import cint
+from core.utils import profile
+
+MIS_CACHE_KEY = "mis_list_cache"
+
+# Bounds how long a payload rebuilt from a snapshot older than the last write can live
+MIS_CACHE_TTL = 5 * 60
 
 @frappe.whitelist()
+@profile()
 def list(is_product=None):
-    
-    try:
-        # Build filters based on is_product argument
-        filters = {}
-        if is_product is not None:
-            filters["is_product"] = int(is_product)  # Convert boolean to integer (0/1)
 
-        # Fetch AGK_MIS records with optional filters
-        agk_mis_records = get_all("AGK_MIS", fields=["name", "is_product", "mis_indicator"], filters=filters)
+    try:
+        records = get_mis_records()
 
-        # Include child table data (category and code fields only) for each record
-        for record in agk_mis_records:
-            doc = get_doc("AGK_MIS", record["name"])
-            record["sub_categories"] = [
-                {"category": child.get("category"), "code": child.get("code")}
-                for child in doc.get("sub_categories", [])
-            ]
+        # Apply the optional is_product filter on the cached payload
+        if is_product is not None:
+            is_product = cint(is_product)  # Convert boolean to integer (0/1)
+            records = [record for record in records if cint(record["is_product"]) == is_product]
 
         # Return the data as JSON
-        return (agk_mis_records)
+        return records
 
     except Exception as e:
         frappe.log_error(frappe.get_traceback(), "Error in get_agk_mis_with_children")
         frappe.throw(f"An error occurred: {str(e)}")
+
+def get_mis_records():
+    """
+    Return every AGK_MIS record with its sub categories (category and code only).
+    Built with one parent query and one child query, cached until AGK_MIS changes.
+    """
+    cache = frappe.cache()
+    records = cache.get_value(MIS_CACHE_KEY)
+    if records is not None:
+        return records
+
+    records = frappe.db.sql("""
+        SELECT name, is_product, mis_indicator
+        FROM `tabAGK_MIS`
+        ORDER BY modified DESC
+    """, as_dict=1)
+
+    sub_categories = frappe.db.sql("""
+        SELECT parent, category, code
+        FROM `tabMIS Subcategories`
+        WHERE parenttype = 'AGK_MIS' AND parentfield = 'sub_categories'
+        ORDER BY parent, idx
+    """, as_dict=1)
+
+    # Group child rows by parent in Python
+    grouped = {}
+    for row in sub_categories:
+        grouped.setdefault(row.parent, []).append({"category": row.category, "code": row.code})
+
+    records = [
+        {
+            "name": record.name,
+            "is_product": record.is_product,
+            "mis_indicator": record.mis_indicator,
+            "sub_categories": grouped.get(record.name, [])
+        }
+        for record in records
+    ]
+
+    cache.set_value(MIS_CACHE_KEY, records, expires_in_sec=MIS_CACHE_TTL)
+    return records
+
+def clear_cache(doc=None, method=None):
+    """Drop the cached MIS payload once an AGK_MIS write is committed."""
+    frappe.db.after_commit.add(lambda: frappe.cache().delete_value(MIS_CACHE_KEY))
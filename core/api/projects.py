@@ -2,28 +2,23 @@ from frappe import _, throw
 from frappe.utils.response import json_handler
 import frappe
 import json
+from core.utils import profile, get_approver_directory
 
 @frappe.whitelist()
+@profile()
 def approvers(code):
     try:
-        # Fetch the parent document where the code exists in the child table
-        project = frappe.get_all(
-            "AGK_Projects",
-            filters={"status": "Active"},
-            fields=["name", "primary_approver", "proxy_approver"],
-            or_filters=[
-                ["Project Detail", "code", "=", code]
-            ]
-        )
+        # Look up the active project owning the code in the approver directory
+        project = get_approver_directory()["project_codes"].get(code)
 
         # If no project is found, raise an error
-        if not project:
+        if not project or project[2] != "Active":
             throw(_("No project found with the provided code."))
 
         # Return the approvers
         return {
-            "primary_approver": project[0].get("primary_approver"),
-            "proxy_approver": project[0].get("proxy_approver")
+            "primary_approver": project[0],
+            "proxy_approver": project[1]
         }
     except Exception as e:
         # Handle exceptions and return an error response
@@ -31,6 +26,7 @@ def approvers(code):
 
 
 @frappe.whitelist()
+@profile()
 def list(limit=20, start=0, query=None):
     try:
         # Convert pagination parameters to integers
@@ -1,7 +1,9 @@
 import frappe
 from frappe import _
+from core.utils import profile
 
 @frappe.whitelist()
+@profile()
 def list():
     
     try:
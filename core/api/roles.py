@@ -0,0 +1,169 @@
+import frappe
+from frappe import _
+from frappe.utils import cint, now
+from core import PERMISSION_GENERATION_KEY
+from core.utils import bump_counter
+
+# (doctype, approver field, role, extra condition) of the lead roles derived from masters
+LEAD_ROLES = [
+    ("AGK_Projects", "primary_approver", "Project Lead", "status = 'Active'"),
+    ("AGK_Projects", "proxy_approver", "Proxy Project Lead", "status = 'Active'"),
+    ("AGK_Departments", "primary_approver", "Department Lead", None),
+    ("AGK_Departments", "proxy_approver", "Proxy Department Lead", None),
+]
+
+# AGK_ERP_Products field -> role suffix, the roles created by core.api.products.create
+MODULE_ROLES = {
+    "primary_fl": "FL",
+    "proxy_fl": "PFL",
+    "admin": "Admin",
+}
+
+def reconcile_doc(doc, method=None):
+    """
+    Doc event hook for AGK_Projects, AGK_Departments and AGK_ERP_Products.
+    Reconciles lead roles of every user the document references now or referenced before.
+    """
+    fields = {field for _, field, _, _ in LEAD_ROLES} | set(MODULE_ROLES)
+    old_doc = doc.get_doc_before_save()
+
+    users = {doc.get(field) for field in fields}
+    if old_doc:
+        users |= {old_doc.get(field) for field in fields}
+
+    users = {user.lower() for user in users if isinstance(user, str) and user}
+    if users:
+        reconcile(users)
+
+@frappe.whitelist()
+def reconcile_all(dry_run=1):
+    """
+    Repair lead role drift for the whole site. By default only returns the rows that
+    would be added and removed; with `dry_run=0` the repair runs in a background job.
+    """
+    frappe.only_for("System Manager")
+    if cint(dry_run):
+        return reconcile(dry_run=True)
+
+    frappe.enqueue("core.api.roles.reconcile", queue="long", timeout=1800)
+    return _("Role reconciliation has been queued.")
+
+def reconcile(users=None, dry_run=False):
+    """
+    Make `Has Role` match the lead roles derived from AGK_Projects, AGK_Departments
+    and AGK_ERP_Products, for `users` or (when None) every user.
+    Missing rows are bulk inserted and stale ones deleted with one statement per role.
+    Managed roles that no master backs are removed, including ones assigned by hand.
+    With `dry_run`, nothing is written and only the diff is returned.
+    """
+    managed = managed_roles()
+    desired = desired_roles(users)
+    current = current_roles(managed, users)
+
+    # Only assign roles that exist, to users that exist
+    to_add = desired - current
+    if to_add:
+        roles = set(frappe.get_all("Role", filters={"name": ["in", list({r for _, r in to_add})]}, pluck="name"))
+        members = {
+            name.lower(): name
+            for name in frappe.get_all("User", filters={"name": ["in", list({u for u, _ in to_add})]}, pluck="name")
+        }
+        to_add = {(members[user], role) for user, role in to_add if role in roles and user in members}
+
+    to_remove = current - desired
+
+    if dry_run:
+        return {
+            "added": sorted(to_add),
+            "removed": sorted(to_remove)
+        }
+
+    if to_add:
+        timestamp = now()
+        frappe.db.bulk_insert(
+            "Has Role",
+            fields=["name", "parent", "parenttype", "parentfield", "role", "idx",
+                    "creation", "modified", "owner", "modified_by"],
+            values=[
+                (frappe.generate_hash(length=10), user, "User", "roles", role, 0,
+                 timestamp, timestamp, frappe.session.user, frappe.session.user)
+                for user, role in sorted(to_add)
+            ]
+        )
+
+    removals = {}
+    for user, role in to_remove:
+        removals.setdefault(role, []).append(user)
+    for role, role_users in removals.items():
+        frappe.db.sql("""
+            DELETE FROM `tabHas Role`
+            WHERE parenttype = 'User' AND role = %(role)s AND parent IN %(users)s
+        """, {"role": role, "users": tuple(role_users)})
+
+    # Bulk writes skip the User controller, so clear the role caches it would have
+    changed = {user for user, _ in to_add | to_remove}
+    for user in changed:
+        frappe.clear_cache(user=user)
+    if changed:
+        frappe.db.after_commit.add(lambda: [bump_counter(f"{PERMISSION_GENERATION_KEY}:{user}") for user in changed])
+
+    return {
+        "added": sorted(to_add),
+        "removed": sorted(to_remove)
+    }
+
+def managed_roles():
+    """Every role name the reconciler owns."""
+    modules = frappe.get_all("AGK_ERP_Products", pluck="module_name")
+    return {role for _, _, role, _ in LEAD_ROLES} | {
+        f"{module} {suffix}" for module in modules if module for suffix in MODULE_ROLES.values()
+    }
+
+def desired_roles(users=None):
+    """(user, role) pairs implied by the master doctypes, in one UNION query."""
+    user_filter = "AND `{field}` IN %(users)s" if users is not None else ""
+    selects = []
+
+    for doctype, field, role, condition in LEAD_ROLES:
+        selects.append(f"""
+            SELECT `{field}` AS user, %(role_{len(selects)})s AS role
+            FROM `tab{doctype}`
+            WHERE IFNULL(`{field}`, '') != '' {'AND ' + condition if condition else ''}
+            {user_filter.format(field=field)}
+        """)
+
+    params = {f"role_{i}": role for i, (_, _, role, _) in enumerate(LEAD_ROLES)}
+
+    for field, suffix in MODULE_ROLES.items():
+        selects.append(f"""
+            SELECT `{field}` AS user, CONCAT(module_name, ' {suffix}') AS role
+            FROM `tabAGK_ERP_Products`
+            WHERE IFNULL(`{field}`, '') != '' AND IFNULL(module_name, '') != ''
+            {user_filter.format(field=field)}
+        """)
+
+    if users is not None:
+        if not users:
+            return set()
+        params["users"] = tuple(users)
+
+    # Approver fields may not match the User name's case, so compare lowercased
+    rows = frappe.db.sql("\nUNION\n".join(selects), params)
+    return {(user.lower(), role) for user, role in rows}
+
+def current_roles(managed, users=None):
+    """(user, role) pairs in Has Role for the managed roles."""
+    if not managed or (users is not None and not users):
+        return set()
+
+    conditions = ["parenttype = 'User'", "role IN %(roles)s"]
+    params = {"roles": tuple(managed)}
+    if users is not None:
+        conditions.append("parent IN %(users)s")
+        params["users"] = tuple(users)
+
+    rows = frappe.db.sql(f"""
+        SELECT parent, role FROM `tabHas Role`
+        WHERE {' AND '.join(conditions)}
+    """, params)
+    return {(user.lower(), role) for user, role in rows}
@@ -1,87 +1,130 @@
+import re
 import frappe
-from frappe.utils import cstr
+from frappe.utils import cint, cstr
+from core.api import masters
+from core.utils import profile, get_counter
+
+# Per-worker typeahead indexes, keyed by site and category and rebuilt when the
+# master data section of the same name changes version. Workers serve every site
+# of the bench, so entries are never shared between sites.
+_indexes = {}
+
+GRAM_SIZE = 3
 
 @frappe.whitelist()
-def search(query):
+@profile()
+def search(query, limit=20):
     """
     Global search API that returns results based on the provided query.
+    Matches are ranked exact > prefix > word prefix > substring, `limit` per category.
     """
-    query = f"%{query}%"
-    results = {
-        "projects": set(),
-        "departments": set(),
-        "facilities": set(),
-        "rigs": set(),
-        "mis": set()
-    }
-
-    # Search Rigs
-    rigs = frappe.db.sql("""
-        SELECT rig_name as name, rig_code as code
-        FROM `tabAGK_Rigs`
-        WHERE status = 'Active'
-        AND (rig_name LIKE %(query)s OR rig_code LIKE %(query)s)
-    """, {'query': query}, as_dict=1)
-    for rig in rigs:
-        results["rigs"].add((rig.name, rig.code))
-
-    # Search Facilities
-    facilities = frappe.db.sql("""
-        SELECT facility_name as name, facility_code as code
-        FROM `tabAGK_Facilities`
-        WHERE status = 'Active'
-        AND (facility_name LIKE %(query)s OR facility_code LIKE %(query)s)
-    """, {'query': query}, as_dict=1)
-    for facility in facilities:
-        results["facilities"].add((facility.name, facility.code))
-
-    # Search MIS and MIS Subcategories
-    mis = frappe.db.sql("""
-        SELECT category as name, mis_indicator
-        FROM `tabAGK_MIS`
-        WHERE category LIKE %(query)s OR mis_indicator LIKE %(query)s
-    """, {'query': query}, as_dict=1)
-    for m in mis:
-        results["mis"].add((m.name, m.mis_indicator))
-
-    mis_subcategories = frappe.db.sql("""
-        SELECT category as name, code
-        FROM `tabMIS Subcategories`
-        WHERE category LIKE %(query)s OR code LIKE %(query)s
-    """, {'query': query}, as_dict=1)
-    for sub in mis_subcategories:
-        results["mis"].add((sub.name, sub.code))
-
-    # Search Projects and Project Details
-    projects = frappe.db.sql("""
-        SELECT pd.name1 as name, pd.code as detail_code
-        FROM `tabAGK_Projects` p
-        LEFT JOIN `tabProject Detail` pd ON pd.parent = p.name
-        WHERE p.status = 'Active'
-        AND (
-            p.project_name LIKE %(query)s
-            OR p.indicator LIKE %(query)s
-            OR pd.name1 LIKE %(query)s
-            OR pd.code LIKE %(query)s
-        )
-    """, {'query': query}, as_dict=1)
-    for project in projects:
-        results["projects"].add((project.name, project.detail_code))
-
-    # Search Departments
-    departments = frappe.db.sql("""
-        SELECT department_name as name, department_code as code
-        FROM `tabAGK_Departments`
-        WHERE department_name LIKE %(query)s OR department_code LIKE %(query)s
-    """, {'query': query}, as_dict=1)
-    for department in departments:
-        results["departments"].add((department.name, department.code))
-
-    # Convert sets to lists of dictionaries
-    return {
-        category: [
+    query = cstr(query).strip().lower()
+    limit = cint(limit) or 20
+
+    versions = masters.get_section_versions()
+    global_version = get_counter(masters.VERSION_KEY)
+
+    results = {}
+    for category in ENTRIES:
+        # The master data cache version, so the index is built from that version's data
+        version = masters.cache_version(versions[category], global_version)
+        index = get_index(category, version)
+        results[category] = [
             {"name": name, "code": code}
-            for name, code in items
+            for name, code in search_index(index, query, limit)
         ]
-        for category, items in results.items()
-    }
+
+    return results
+
+def get_index(category, version):
+    site_indexes = _indexes.setdefault(frappe.local.site, {})
+    index = site_indexes.get(category)
+    if index is None or index["version"] != version:
+        index = build_index(ENTRIES[category](masters.get_section(category, version)))
+        index["version"] = version
+        site_indexes[category] = index
+    return index
+
+def build_index(entries):
+    """
+    Build an n-gram index from (name, code, searchable values) tuples.
+    Duplicate (name, code) pairs are merged, as the SQL version returned sets.
+    """
+    merged = {}
+    for name, code, values in entries:
+        merged.setdefault((name, code), set()).update(cstr(v).lower() for v in values if v)
+
+    index = {"results": [], "values": [], "grams": {}}
+    for position, (result, values) in enumerate(merged.items()):
+        index["results"].append(result)
+        index["values"].append(tuple(values))
+        for value in values:
+            for gram in ngrams(value):
+                index["grams"].setdefault(gram, set()).add(position)
+    return index
+
+def search_index(index, query, limit):
+    if len(query) >= GRAM_SIZE:
+        # Candidates must contain every n-gram of the query
+        postings = sorted((index["grams"].get(gram, set()) for gram in ngrams(query)), key=len)
+        candidates = set.intersection(*postings) if postings else set()
+    else:
+        candidates = range(len(index["results"]))
+
+    ranked = []
+    for position in candidates:
+        ranks = [rank for rank in (match_rank(value, query) for value in index["values"][position]) if rank is not None]
+        if ranks:
+            ranked.append((min(ranks), cstr(index["results"][position][0]).lower(), position))
+
+    ranked.sort()
+    return [index["results"][position] for _, _, position in ranked[:limit]]
+
+def match_rank(value, query):
+    """Lower is better, None when `value` does not contain `query`."""
+    if not query:
+        return 3
+    if value == query:
+        return 0
+    if value.startswith(query):
+        return 1
+    if query not in value:
+        return None
+    if any(word.startswith(query) for word in re.split(r"[\s\-_/]+", value)):
+        return 2
+    return 3
+
+def ngrams(value):
+    return {value[i:i + GRAM_SIZE] for i in range(len(value) - GRAM_SIZE + 1)}
+
+def project_entries(details):
+    for d in details:
+        yield d["name1"], d["code"], (d["project_name"], d["indicator"], d["name1"], d["code"])
+
+def department_entries(departments):
+    for d in departments:
+        yield d["department_name"], d["department_code"], (d["department_name"], d["department_code"])
+
+def facility_entries(facilities):
+    for f in facilities:
+        yield f["facility_name"], f["facility_code"], (f["facility_name"], f["facility_code"])
+
+def rig_entries(rigs):
+    for r in rigs:
+        yield r["rig_name"], r["rig_code"], (r["rig_name"], r["rig_code"])
+
+def mis_entries(records):
+    # MIS categories and their sub categories share one result list
+    for m in records:
+        yield m["name"], m["mis_indicator"], (m["name"], m["mis_indicator"])
+        for sub in m["sub_categories"]:
+            yield sub["category"], sub["code"], (sub["category"], sub["code"])
+
+# Result category (same as the master data section) -> index entries
+ENTRIES = {
+    "projects": project_entries,
+    "departments": department_entries,
+    "facilities": facility_entries,
+    "rigs": rig_entries,
+    "mis": mis_entries
+}
@@ -0,0 +1,115 @@
+# Copyright (c) 2025, Agnikul Cosmos Private Limited and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from core.api.employee import bulk_sync_users
+
+STATUS_OPTIONS = "Active\nInactive\nSuspended\nLeft"
+
+
+class TestBulkSyncUsers(FrappeTestCase):
+	def sync(self, employees, users, status=None):
+		"""
+		Run bulk_sync_users against in-memory Employee and User rows.
+		Returns (result, database mock, inserted User emails).
+		"""
+		inserted = []
+
+		def get_all(doctype, filters=None, fields=None, pluck=None, as_list=False):
+			if doctype == "Employee":
+				return [frappe._dict(employee) for employee in employees]
+			if pluck == "email":
+				# MariaDB compares emails case-insensitively
+				wanted = {email.lower() for email in filters["email"][1]}
+				return [user["email"] for user in users if user["email"] in wanted]
+			wanted = {name.lower() for name in filters["name"][1]}
+			return [(user["name"], user["enabled"]) for user in users if user["name"] in wanted]
+
+		def get_doc(data):
+			doc = MagicMock()
+
+			def insert(**kwargs):
+				# User.autoname lower-cases the email
+				name = data["email"].lower()
+				users.append({"name": name, "email": name, "enabled": 1})
+				inserted.append(data["email"])
+				return frappe._dict(name=name)
+
+			doc.insert.side_effect = insert
+			return doc
+
+		meta = MagicMock()
+		meta.get_options.return_value = STATUS_OPTIONS
+		db = MagicMock()
+		db.exists.return_value = False
+
+		with patch("frappe.only_for"), \
+				patch("frappe.get_all", get_all), \
+				patch("frappe.get_doc", get_doc), \
+				patch("frappe.get_meta", return_value=meta), \
+				patch("frappe.clear_cache"), \
+				patch("frappe.db", db), \
+				patch("core.api.employee.clear_sessions"), \
+				patch("core.api.employee.get_approver_references", return_value={}):
+			result = bulk_sync_users([employee["name"] for employee in employees], status)
+
+		return result, db, inserted
+
+	def employee(self, name, email, status="Active", user_id=None):
+		return {
+			"name": name, "employee_name": name, "first_name": name, "company_email": email,
+			"user_id": user_id, "status": status, "image": None, "date_of_birth": None,
+			"relieving_date": None
+		}
+
+	def test_existing_user_with_mixed_case_email(self):
+		users = [{"name": "john.doe@agnikul.in", "email": "john.doe@agnikul.in", "enabled": 0}]
+		result, db, inserted = self.sync(
+			[self.employee("EMP-1", "John.Doe@Agnikul.in", user_id="john.doe@agnikul.in")], users
+		)
+
+		self.assertEqual(inserted, [])
+		self.assertEqual(result["created"], [])
+		self.assertEqual(result["enabled"], ["john.doe@agnikul.in"])
+		db.bulk_update.assert_not_called()
+
+	def test_new_user_with_mixed_case_email(self):
+		result, db, inserted = self.sync([self.employee("EMP-2", "Jane.Roe@Agnikul.in")], [])
+
+		self.assertEqual(inserted, ["Jane.Roe@Agnikul.in"])
+		self.assertEqual(result["created"], ["jane.roe@agnikul.in"])
+		# user_id is the User name, not the company email as typed
+		db.bulk_update.assert_called_once_with(
+			"Employee", {"EMP-2": {"user_id": "jane.roe@agnikul.in"}}, update_modified=False
+		)
+		self.assertEqual(result["enabled"], [])
+		self.assertEqual(result["disabled"], [])
+
+	def test_duplicate_emails_in_batch_create_one_user(self):
+		result, db, inserted = self.sync([
+			self.employee("EMP-3", "Sam@Agnikul.in"),
+			self.employee("EMP-4", "sam@agnikul.in")
+		], [])
+
+		self.assertEqual(inserted, ["Sam@Agnikul.in"])
+		self.assertEqual(result["created"], ["sam@agnikul.in"])
+
+	def test_offboarding_disables_users(self):
+		users = [{"name": "ravi@agnikul.in", "email": "ravi@agnikul.in", "enabled": 1}]
+		employee = self.employee("EMP-5", "Ravi@Agnikul.in", user_id="Ravi@Agnikul.in")
+		result, db, inserted = self.sync([employee], users, status="Inactive")
+
+		self.assertEqual(result["disabled"], ["ravi@agnikul.in"])
+		self.assertEqual(result["enabled"], [])
+
+	def test_invalid_status_is_rejected(self):
+		with self.assertRaises(frappe.ValidationError):
+			self.sync([self.employee("EMP-6", "a@agnikul.in")], [], status="Gone")
+
+	def test_left_requires_relieving_date(self):
+		with self.assertRaises(frappe.ValidationError):
+			self.sync([self.employee("EMP-7", "b@agnikul.in")], [], status="Left")
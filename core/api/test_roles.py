@@ -0,0 +1,96 @@
+# Copyright (c) 2025, Agnikul Cosmos Private Limited and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+from frappe.tests.utils import FrappeTestCase
+
+from core.api import roles
+
+
+class TestReconcile(FrappeTestCase):
+	def reconcile(self, desired, current, existing_roles, existing_users, **kwargs):
+		"""
+		Run reconcile against the given (user, role) pairs.
+		Returns (result, database mock, clear_cache mock).
+		"""
+
+		def get_all(doctype, filters=None, pluck=None):
+			existing = existing_roles if doctype == "Role" else existing_users
+			# MariaDB compares names case-insensitively
+			wanted = {name.lower() for name in filters["name"][1]}
+			return [name for name in existing if name.lower() in wanted]
+
+		db = MagicMock()
+		with patch.object(roles, "managed_roles", return_value={"Project Lead", "Department Lead"}), \
+				patch.object(roles, "desired_roles", return_value=set(desired)), \
+				patch.object(roles, "current_roles", return_value=set(current)), \
+				patch("frappe.get_all", get_all), \
+				patch("frappe.db", db), \
+				patch("frappe.clear_cache") as clear_cache:
+			result = roles.reconcile(**kwargs)
+
+		return result, db, clear_cache
+
+	def test_diff(self):
+		result, db, clear_cache = self.reconcile(
+			desired=[("asha@agnikul.in", "Project Lead"), ("ravi@agnikul.in", "Department Lead"),
+				("gone@agnikul.in", "Project Lead"), ("ravi@agnikul.in", "Missing Role")],
+			current=[("ravi@agnikul.in", "Department Lead"), ("old@agnikul.in", "Project Lead")],
+			existing_roles=["Project Lead", "Department Lead"],
+			existing_users=["Asha@agnikul.in", "ravi@agnikul.in"]
+		)
+
+		# Users are added under their User name, unknown users and roles are skipped
+		self.assertEqual(result, {
+			"added": [("Asha@agnikul.in", "Project Lead")],
+			"removed": [("old@agnikul.in", "Project Lead")]
+		})
+
+		(values,) = [call.kwargs["values"] for call in db.bulk_insert.call_args_list]
+		self.assertEqual([(row[1], row[4]) for row in values], [("Asha@agnikul.in", "Project Lead")])
+		db.sql.assert_called_once()
+		self.assertEqual(db.sql.call_args.args[1], {"role": "Project Lead", "users": ("old@agnikul.in",)})
+		self.assertEqual(
+			sorted(call.kwargs["user"] for call in clear_cache.call_args_list),
+			["Asha@agnikul.in", "old@agnikul.in"]
+		)
+		db.after_commit.add.assert_called_once()
+
+	def test_dry_run_does_not_write(self):
+		result, db, clear_cache = self.reconcile(
+			desired=[("asha@agnikul.in", "Project Lead")],
+			current=[("old@agnikul.in", "Department Lead")],
+			existing_roles=["Project Lead"],
+			existing_users=["asha@agnikul.in"],
+			dry_run=True
+		)
+
+		self.assertEqual(result, {
+			"added": [("asha@agnikul.in", "Project Lead")],
+			"removed": [("old@agnikul.in", "Department Lead")]
+		})
+		db.bulk_insert.assert_not_called()
+		db.sql.assert_not_called()
+		db.after_commit.add.assert_not_called()
+		clear_cache.assert_not_called()
+
+	def test_no_drift(self):
+		pairs = [("asha@agnikul.in", "Project Lead")]
+		result, db, clear_cache = self.reconcile(pairs, pairs, ["Project Lead"], ["asha@agnikul.in"])
+
+		self.assertEqual(result, {"added": [], "removed": []})
+		db.bulk_insert.assert_not_called()
+		db.sql.assert_not_called()
+		db.after_commit.add.assert_not_called()
+
+	def test_reconcile_all_previews_by_default(self):
+		with patch("frappe.only_for"), \
+				patch("frappe.enqueue") as enqueue, \
+				patch.object(roles, "reconcile", return_value={"added": [], "removed": []}) as reconcile:
+			self.assertEqual(roles.reconcile_all(), {"added": [], "removed": []})
+			reconcile.assert_called_once_with(dry_run=True)
+			enqueue.assert_not_called()
+
+			roles.reconcile_all(dry_run="0")
+			enqueue.assert_called_once()
@@ -0,0 +1,68 @@
+# Copyright (c) 2025, Agnikul Cosmos Private Limited and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from core.api import search
+from core.api.search import build_index, department_entries, get_index, search_index
+
+
+class TestSearchIndex(FrappeTestCase):
+	def setUp(self):
+		self.index = build_index(department_entries([
+			{"department_name": "Avionics Testing", "department_code": "AVT"},
+			{"department_name": "Test", "department_code": "TST"},
+			{"department_name": "Testing", "department_code": "TSG"},
+			{"department_name": "Quality", "department_code": "QLT"},
+			{"department_name": "Contest Operations", "department_code": "CON"}
+		]))
+
+	def test_ranking(self):
+		# Exact, then prefix, then word prefix, then substring matches
+		self.assertEqual(search_index(self.index, "test", 10), [
+			("Test", "TST"),
+			("Testing", "TSG"),
+			("Avionics Testing", "AVT"),
+			("Contest Operations", "CON")
+		])
+
+	def test_matches_codes(self):
+		self.assertEqual(search_index(self.index, "qlt", 10), [("Quality", "QLT")])
+
+	def test_limit(self):
+		self.assertEqual(search_index(self.index, "test", 2), [("Test", "TST"), ("Testing", "TSG")])
+
+	def test_short_and_missing_queries(self):
+		# Queries shorter than the n-gram size scan every entry
+		self.assertEqual(search_index(self.index, "qu", 10), [("Quality", "QLT")])
+		self.assertEqual(search_index(self.index, "rocket", 10), [])
+
+	def test_duplicates_are_merged(self):
+		index = build_index([
+			("Pump", "P1", ("Pump", "P1")),
+			("Pump", "P1", ("Pump Station",))
+		])
+		self.assertEqual(search_index(index, "station", 10), [("Pump", "P1")])
+		self.assertEqual(len(index["results"]), 1)
+
+	def test_index_is_rebuilt_per_version_and_site(self):
+		loads = []
+
+		def get_section(category, version):
+			loads.append((frappe.local.site, version))
+			return [{"department_name": f"Dept {version}", "department_code": "D"}]
+
+		with patch("core.api.masters.get_section", get_section), patch.dict(search._indexes, clear=True):
+			with patch.object(frappe.local, "site", "a.local"):
+				get_index("departments", 1)
+				get_index("departments", 1)
+				index = get_index("departments", 2)
+			with patch.object(frappe.local, "site", "b.local"):
+				get_index("departments", 2)
+
+		# Built from the section data of the requested version, once per site and version
+		self.assertEqual(loads, [("a.local", 1), ("a.local", 2), ("b.local", 2)])
+		self.assertEqual(search_index(index, "dept", 10), [("Dept 2", "D")])
@@ -5,6 +5,8 @@ from .delete_app import delete_app
 from .backup_doctype import backup_doctype
 
 from .restore_doctype import restore_doctype
+from .repair_sequences import repair_sequences
+from .verify_backup import verify_backup
 
 commands = [
     hello_world,
@@ -13,4 +15,6 @@ commands = [
     delete_app,
     backup_doctype,
     restore_doctype,
+    repair_sequences,
+    verify_backup,
 ]
\ No newline at end of file
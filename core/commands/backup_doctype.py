@@ -1,29 +1,35 @@
 from __future__ import unicode_literals, absolute_import
 import os
-import json
 import click
 import frappe
-from datetime import datetime, date
+from datetime import datetime, timedelta
 from termcolor import colored
-
-def json_datetime_handler(obj):
-    if isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    raise TypeError(f"Type {type(obj)} not serializable")
+from core.commands.backup_utils import (
+    CHUNK_SIZE, BackupWriter, attach_children, export_doctype_compact, get_child_tables,
+    iter_chunks, write_manifest
+)
 
 @click.command('backup-doctype')
 @click.option('--site', default=None, type=str, help='Specify the site name (optional). If not provided, uses the current site.')
 @click.argument('doctype', type=str)
 @click.option('--from', 'start_date', default=None, type=str, help='Start date in YYYY-MM-DD format (optional, use --from).')
-@click.option('--to', 'end_date', default=None, type=str, help='End date in YYYY-MM-DD format (optional, use --to).')
-def backup_doctype(site, doctype, start_date, end_date):
+@click.option('--to', 'end_date', default=None, type=str, help='End date in YYYY-MM-DD format, inclusive (optional, use --to).')
+@click.option('--modified-since', default=None, type=str, help='Only back up documents modified at or after this date or datetime (YYYY-MM-DD [HH:MM:SS]).')
+@click.option('--format', 'output_format', default='json', type=click.Choice(['json', 'ndjson', 'compact']), help='json writes a list, ndjson one document per line, compact a directory of compressed chunks with a name index (default: json).')
+@click.option('--chunk-size', default=CHUNK_SIZE, type=int, help=f'Rows read per query (default: {CHUNK_SIZE}).')
+def backup_doctype(site, doctype, start_date, end_date, modified_since, output_format, chunk_size):
     """
     Backup a specific Doctype within a given date range.
 
     This command:
     - Validates the given date range with the creation date of the documents.
-    - Fetches documents for the specified Doctype within the date range.
-    - Saves the backup in JSON format in the bench/sites/backup/Doctype folder with a timestamped filename.
+    - Fetches documents for the specified Doctype within the date range, in keyset-paginated
+      chunks ordered by creation, with one query per child table per chunk.
+    - Optionally only fetches documents modified since a date with --modified-since.
+    - Streams the backup in JSON or NDJSON format to the bench/sites/backup/Doctype folder with a timestamped filename.
+      Child rows are stored under "child_tables", as in backup-app.
+    - With --format compact, writes a directory of gzip compressed column-major chunks, a name
+      index and a manifest, so restore-doctype --name can restore single documents quickly.
 
     Examples:
     \b
@@ -31,6 +37,8 @@ def backup_doctype(site, doctype, start_date, end_date):
     - bench backup-doctype User --from 2025-01-01 --to 2025-01-31 --site mysite
     - bench backup-doctype User --from 2025-01-01
     - bench backup-doctype User --to 2025-01-31
+    - bench backup-doctype "Error Log" --modified-since 2025-02-01 --format ndjson
+    - bench backup-doctype User --format compact
     """
     # Determine the site
     if not site:
@@ -52,6 +60,7 @@ def backup_doctype(site, doctype, start_date, end_date):
     # Validate and parse date range if provided
     start_date_obj = None
     end_date_obj = None
+    modified_since_obj = None
     if start_date:
         try:
             start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
@@ -66,6 +75,17 @@ def backup_doctype(site, doctype, start_date, end_date):
             click.echo(colored("Error: Invalid end date format. Use YYYY-MM-DD.", 'black', 'on_red'))
             frappe.destroy()
             return
+    if modified_since:
+        for date_format in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+            try:
+                modified_since_obj = datetime.strptime(modified_since, date_format)
+                break
+            except ValueError:
+                continue
+        else:
+            click.echo(colored("Error: Invalid modified since format. Use YYYY-MM-DD or YYYY-MM-DD HH:MM:SS.", 'black', 'on_red'))
+            frappe.destroy()
+            return
     if start_date_obj and end_date_obj and start_date_obj > end_date_obj:
         click.echo(colored("Error: Start date cannot be after end date.", 'black', 'on_red'))
         frappe.destroy()
@@ -75,44 +95,55 @@ def backup_doctype(site, doctype, start_date, end_date):
     timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
     backup_dir = os.path.join('..', 'sites', 'backup', 'doctype', doctype)
     os.makedirs(backup_dir, exist_ok=True)
-    backup_file = os.path.join(backup_dir, f"{doctype}-{timestamp}.json")
+    if output_format == 'compact':
+        backup_file = os.path.join(backup_dir, f"{doctype}-{timestamp}")
+    else:
+        backup_file = os.path.join(backup_dir, f"{doctype}-{timestamp}.{output_format}")
+
+    # Parameterized filters, the end date includes the whole day
+    conditions, params = [], {}
+    if start_date_obj:
+        conditions.append("`creation` >= %(start)s")
+        params["start"] = start_date_obj
+    if end_date_obj:
+        conditions.append("`creation` < %(end)s")
+        params["end"] = end_date_obj + timedelta(days=1)
+    if modified_since_obj:
+        conditions.append("`modified` >= %(modified_since)s")
+        params["modified_since"] = modified_since_obj
+
+    # Walk the index of the column being filtered on
+    keys = ("modified", "name") if modified_since_obj else ("creation", "name")
 
-    # Fetch documents within the date range
     try:
-        if start_date_obj and end_date_obj:
-            query = f"""
-                SELECT * FROM `tab{doctype}`
-                WHERE creation BETWEEN '{start_date}' AND '{end_date}'
-            """
-        elif start_date_obj:
-            query = f"""
-                SELECT * FROM `tab{doctype}`
-                WHERE creation >= '{start_date}'
-            """
-        elif end_date_obj:
-            query = f"""
-                SELECT * FROM `tab{doctype}`
-                WHERE creation <= '{end_date}'
-            """
+        if output_format == 'compact':
+            # Chunk files and index in their own directory, with a manifest for verify-backup
+            os.makedirs(backup_file, exist_ok=True)
+            entry = export_doctype_compact(doctype, backup_file, "gzip", conditions, params, chunk_size, keys=keys)
+            write_manifest(backup_file, {
+                "doctype": doctype,
+                "created": datetime.now().isoformat(),
+                "format": "compact",
+                "compression": "gzip",
+                "doctypes": {doctype: entry}
+            })
+            rows = entry["rows"]
         else:
-            query = f"SELECT * FROM `tab{doctype}`"
-        documents = frappe.db.sql(query, as_dict=True)
-
-        # Fetch child table data
-        child_tables = frappe.get_all("DocField", filters={"parent": doctype, "fieldtype": "Table"}, fields=["options"])
-        for child_table in child_tables:
-            for doc in documents:
-                child_query = f"SELECT * FROM `tab{child_table.options}` WHERE parent = '{doc['name']}'"
-                doc[child_table.options] = frappe.db.sql(child_query, as_dict=True)
+            child_tables = get_child_tables(doctype)
 
-        # Save documents to JSON file
-        with open(backup_file, 'w') as f:
-            json.dump(documents, f, indent=4, default=json_datetime_handler)
+            # Stream documents chunk by chunk, with one child query per child table per chunk
+            with BackupWriter(backup_file, array=output_format == 'json') as writer:
+                for chunk in iter_chunks(doctype, conditions, params, chunk_size, keys=keys):
+                    attach_children(doctype, chunk, child_tables)
+                    for row in chunk:
+                        writer.write(row)
+            rows = writer.rows
 
+        click.echo(f"Backed up {rows} documents to {os.path.basename(backup_file)}")
         click.echo(colored(f"Backup completed for Doctype '{doctype}'", 'black', 'on_green'))
     except Exception as e:
         click.echo(colored(f"Error backing up Doctype '{doctype}': {e}", 'black', 'on_red'))
     finally:
         frappe.destroy()
 
-commands = [backup_doctype]
\ No newline at end of file
+commands = [backup_doctype]
@@ -0,0 +1,704 @@
+"""
+Shared helpers of the backup and restore commands.
+
+Doctypes are exported as newline-delimited JSON, one parent row per line with its
+child rows under `child_tables`, read in keyset-paginated chunks with one query per
+child table per chunk. Every backup directory has a `manifest.json` with the row
+counts and sha256 checksums of its files.
+"""
+
+from __future__ import unicode_literals, absolute_import
+import os
+import io
+import gzip
+import json
+import hashlib
+import time
+from contextlib import contextmanager
+import frappe
+from frappe.utils.response import json_handler
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CHUNK_SIZE = 1000
+
+# Incremental backups re-read this many seconds before the previous snapshot, to pick up
+# transactions that were still open when it started and committed with an older `modified`
+INCREMENTAL_OVERLAP = 60 * 60
+MANIFEST_FILE = "manifest.json"
+COMPACT_SUFFIX = ".compact"
+
+# Compression -> file extension appended to ".ndjson"
+EXTENSIONS = {
+    "none": "",
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+def check_compression(compression):
+    if compression not in EXTENSIONS:
+        raise ValueError(f"Unknown compression '{compression}', use one of {', '.join(EXTENSIONS)}")
+    if compression == "zstd" and not zstandard:
+        raise ValueError("zstd compression needs the 'zstandard' package, install it or use --compress gzip")
+
+def get_app_doctypes(appname):
+    """Doctypes of every module of the app, in one query."""
+    modules = frappe.get_module_list(appname)
+    if not modules:
+        return []
+    return frappe.get_all("DocType", filters={"module": ["in", modules]}, pluck="name", order_by="name")
+
+def get_child_tables(doctype):
+    """Child doctypes of `doctype`, including those added by custom fields."""
+    child_tables = []
+    for df in frappe.get_meta(doctype).get_table_fields():
+        if df.options not in child_tables:
+            child_tables.append(df.options)
+    return child_tables
+
+def is_exportable(doctype):
+    """Singles and virtual doctypes have no table of their own."""
+    meta = frappe.get_meta(doctype)
+    return not meta.issingle and not getattr(meta, "is_virtual", 0)
+
+def chunked(rows, size=CHUNK_SIZE):
+    """Lists of up to `size` items from any iterable."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def keyset_condition(keys):
+    """
+    `(a, b) > (%(after_0)s, %(after_1)s)` written out as OR-ed equalities,
+    so MariaDB can seek on the index instead of scanning.
+    """
+    clauses = []
+    for i, key in enumerate(keys):
+        parts = [f"`{k}` = %(after_{j})s" for j, k in enumerate(keys[:i])]
+        parts.append(f"`{key}` > %(after_{i})s")
+        clauses.append("(" + " AND ".join(parts) + ")")
+    return "(" + " OR ".join(clauses) + ")"
+
+def iter_chunks(doctype, conditions=None, params=None, chunk_size=CHUNK_SIZE, keys=("name",), fields="*"):
+    """
+    Yield the rows of `doctype` in chunks of `chunk_size`, ordered and paginated by `keys`.
+    `conditions` is a list of SQL conditions using `params`.
+    """
+    conditions = list(conditions or [])
+    params = dict(params or {})
+    order_by = ", ".join(f"`{key}`" for key in keys)
+    after = None
+
+    while True:
+        where = list(conditions)
+        if after is not None:
+            where.append(keyset_condition(keys))
+            params.update({f"after_{i}": value for i, value in enumerate(after)})
+
+        rows = frappe.db.sql(f"""
+            SELECT {fields} FROM `tab{doctype}`
+            {"WHERE " + " AND ".join(where) if where else ""}
+            ORDER BY {order_by}
+            LIMIT {int(chunk_size)}
+        """, params, as_dict=True)
+
+        if not rows:
+            return
+
+        yield rows
+
+        if len(rows) < chunk_size:
+            return
+        after = tuple(rows[-1][key] for key in keys)
+
+def attach_children(doctype, rows, child_tables, counts=None):
+    """
+    Load the child rows of a chunk of parents with one `parent IN` query per child table
+    and attach them to each parent under `child_tables[<child doctype>]`.
+    """
+    names = tuple(row["name"] for row in rows)
+    for row in rows:
+        row["child_tables"] = {child_table: [] for child_table in child_tables}
+
+    if not names:
+        return rows
+
+    by_name = {row["name"]: row for row in rows}
+    for child_table in child_tables:
+        children = frappe.db.sql(f"""
+            SELECT * FROM `tab{child_table}`
+            WHERE parenttype = %(parenttype)s AND parent IN %(names)s
+            ORDER BY parent, parentfield, idx
+        """, {"parenttype": doctype, "names": names}, as_dict=True)
+
+        for child in children:
+            parent = by_name.get(child["parent"])
+            if parent is not None:
+                parent["child_tables"][child_table].append(child)
+
+        if counts is not None:
+            counts[child_table] = counts.get(child_table, 0) + len(children)
+
+    return rows
+
+class HashingWriter:
+    """Binary file wrapper that hashes and counts everything written through it."""
+
+    def __init__(self, path):
+        self.file = open(path, "wb")
+        self.sha256 = hashlib.sha256()
+        self.bytes = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.bytes += len(data)
+        return self.file.write(data)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+class BackupWriter:
+    """
+    Write rows as (optionally compressed) NDJSON, or as a JSON list with `array`,
+    checksumming the file as it is written.
+    """
+
+    def __init__(self, path, compression="none", array=False):
+        check_compression(compression)
+        self.path = path
+        self.array = array
+        self.rows = 0
+        self.raw = HashingWriter(path)
+
+        if compression == "gzip":
+            self.stream = gzip.GzipFile(fileobj=self.raw, mode="wb", compresslevel=6)
+        elif compression == "zstd":
+            self.stream = zstandard.ZstdCompressor(level=3).stream_writer(self.raw, closefd=False)
+        else:
+            self.stream = self.raw
+
+    def write(self, row):
+        line = json.dumps(row, default=json_handler, separators=(",", ":"))
+        if self.array:
+            line = ("[\n" if not self.rows else ",\n") + line
+        else:
+            line += "\n"
+
+        self.stream.write(line.encode("utf-8"))
+        self.rows += 1
+
+    def close(self):
+        if self.array:
+            self.stream.write(b"\n]\n" if self.rows else b"[]\n")
+        if self.stream is not self.raw:
+            self.stream.close()
+        self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def checksum(self):
+        return {"sha256": self.raw.sha256.hexdigest(), "bytes": self.raw.bytes}
+
+def export_doctype(doctype, backup_dir, compression="none", conditions=None, params=None, chunk_size=CHUNK_SIZE, keys=("name",)):
+    """
+    Stream `doctype` with its child rows to `<backup_dir>/<doctype>.ndjson[.gz|.zst]`.
+    Returns the manifest entry of the doctype.
+    """
+    child_tables = get_child_tables(doctype)
+    filename = f"{doctype}.ndjson{EXTENSIONS[compression]}"
+    child_counts = {child_table: 0 for child_table in child_tables}
+
+    with BackupWriter(os.path.join(backup_dir, filename), compression) as writer:
+        for rows in iter_chunks(doctype, conditions, params, chunk_size, keys=keys):
+            attach_children(doctype, rows, child_tables, child_counts)
+            for row in rows:
+                writer.write(row)
+
+    return {
+        "file": filename,
+        "rows": writer.rows,
+        "children": child_counts,
+        **writer.checksum
+    }
+
+def to_columns(rows):
+    """Rows as {column: [values]}, so each key is stored once per chunk instead of once per row."""
+    columns = {}
+    for row in rows:
+        for key in row:
+            columns.setdefault(key, None)
+    return {key: [row.get(key) for row in rows] for key in columns}
+
+def from_columns(columns):
+    count = len(next(iter(columns.values()))) if columns else 0
+    return [{key: values[i] for key, values in columns.items()} for i in range(count)]
+
+def encode_chunk(rows, child_tables):
+    """Column-major form of a chunk of parents and all their child rows."""
+    return {
+        "columns": to_columns([{k: v for k, v in row.items() if k != "child_tables"} for row in rows]),
+        "children": {
+            child_table: to_columns([child for row in rows for child in row["child_tables"].get(child_table, [])])
+            for child_table in child_tables
+        }
+    }
+
+def decode_chunk(chunk):
+    """Rows of a compact chunk with their child rows under `child_tables`."""
+    rows = from_columns(chunk["columns"])
+    by_name = {}
+    for row in rows:
+        row["child_tables"] = {child_table: [] for child_table in chunk["children"]}
+        by_name[row["name"]] = row
+
+    for child_table, columns in chunk["children"].items():
+        for child in from_columns(columns):
+            parent = by_name.get(child.get("parent"))
+            if parent is not None:
+                parent["child_tables"][child_table].append(child)
+
+    return rows
+
+def export_doctype_compact(doctype, backup_dir, compression="gzip", conditions=None, params=None, chunk_size=CHUNK_SIZE, keys=("name",)):
+    """
+    Export `doctype` in the compact format: `<doctype>.compact/chunk-NNNNNN.json[.gz|.zst]`
+    files holding one column-major chunk each, and an `index.json[.gz|.zst]` mapping every
+    document name to its chunk, so single documents can be read without the rest.
+    Returns the manifest entry of the doctype.
+    """
+    extension = EXTENSIONS[compression]
+    child_tables = get_child_tables(doctype)
+    child_counts = {child_table: 0 for child_table in child_tables}
+    directory = f"{doctype}{COMPACT_SUFFIX}"
+    os.makedirs(os.path.join(backup_dir, directory), exist_ok=True)
+
+    chunks, names, total = [], {}, 0
+    for position, rows in enumerate(iter_chunks(doctype, conditions, params, chunk_size, keys=keys)):
+        attach_children(doctype, rows, child_tables, child_counts)
+
+        filename = f"chunk-{position + 1:06d}.json{extension}"
+        with BackupWriter(os.path.join(backup_dir, directory, filename), compression) as writer:
+            writer.write(encode_chunk(rows, child_tables))
+
+        chunks.append({"file": os.path.join(directory, filename), "rows": len(rows), **writer.checksum})
+        names.update((row["name"], position) for row in rows)
+        total += len(rows)
+
+    index_file = os.path.join(directory, f"index.json{extension}")
+    with BackupWriter(os.path.join(backup_dir, index_file), compression) as writer:
+        writer.write({
+            "doctype": doctype,
+            "chunks": [os.path.basename(chunk["file"]) for chunk in chunks],
+            "names": names
+        })
+
+    return {
+        "file": index_file,
+        "format": "compact",
+        "rows": total,
+        "children": child_counts,
+        "chunks": chunks,
+        **writer.checksum
+    }
+
+def is_compact_index(path):
+    return os.path.basename(path).startswith("index.json") and os.path.dirname(path).endswith(COMPACT_SUFFIX)
+
+def read_json_file(path):
+    with open_backup_file(path) as f:
+        return json.load(f)
+
+def iter_compact_rows(index_path, names=None):
+    """
+    Rows of a compact backup from its index. With `names`, only the chunks
+    holding those documents are decompressed.
+    """
+    index = read_json_file(index_path)
+    directory = os.path.dirname(index_path)
+
+    if names is None:
+        positions = range(len(index["chunks"]))
+    else:
+        # Index keys are JSON strings, so compare names as strings
+        names = {str(name) for name in names}
+        positions = sorted({index["names"][name] for name in names if name in index["names"]})
+
+    for position in positions:
+        for row in decode_chunk(read_json_file(os.path.join(directory, index["chunks"][position]))):
+            if names is None or str(row["name"]) in names:
+                yield row
+
+def start_snapshot():
+    """Start a repeatable-read transaction that sees the data as of this moment."""
+    frappe.db.rollback()
+    frappe.db.sql("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+    frappe.db.sql("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+
+def export_names(doctype, backup_dir, compression="none", conditions=None, params=None, chunk_size=CHUNK_SIZE, previous_names=None):
+    """
+    Write the name of every row of `doctype` to `<doctype>.names.ndjson[.gz|.zst]`. When the
+    names file of the previous backup is given, the names missing now are written to
+    `<doctype>.deleted.ndjson[.gz|.zst]`. Returns the "names" and "deleted" manifest entries.
+    """
+    extension = EXTENSIONS[compression]
+    previous = set(iter_backup_rows(previous_names)) if previous_names else None
+
+    names_file = f"{doctype}.names.ndjson{extension}"
+    with BackupWriter(os.path.join(backup_dir, names_file), compression) as writer:
+        for rows in iter_chunks(doctype, conditions, params, chunk_size * 10, fields="name"):
+            for row in rows:
+                writer.write(row["name"])
+                if previous is not None:
+                    previous.discard(row["name"])
+
+    entry = {"names": {"file": names_file, "rows": writer.rows, **writer.checksum}}
+
+    if previous is not None:
+        deleted_file = f"{doctype}.deleted.ndjson{extension}"
+        with BackupWriter(os.path.join(backup_dir, deleted_file), compression) as writer:
+            for name in sorted(previous):
+                writer.write(name)
+        entry["deleted"] = {"file": deleted_file, "rows": writer.rows, **writer.checksum}
+
+    return entry
+
+def export_backup_entry(doctype, backup_dir, compression="none", chunk_size=CHUNK_SIZE, snapshot_at=None, since=None, previous_names=None, output_format="ndjson"):
+    """
+    Export the rows of `doctype` and its names file, returns its manifest entry.
+
+    - `snapshot_at`: leave out rows created after the backup started.
+    - `since`: only export rows modified after this watermark (incremental backups).
+    - `previous_names`: names file of the previous backup, to record deletions.
+    - `output_format`: "ndjson" or "compact".
+    """
+    started = time.monotonic()
+    conditions, params = [], {}
+    if snapshot_at:
+        conditions.append("`creation` <= %(snapshot_at)s")
+        params["snapshot_at"] = snapshot_at
+
+    names_conditions = list(conditions)
+    if since:
+        conditions.append("`modified` > %(since)s")
+        params["since"] = since
+
+    export = export_doctype_compact if output_format == "compact" else export_doctype
+    entry = export(doctype, backup_dir, compression, conditions, params, chunk_size)
+    entry.update(export_names(doctype, backup_dir, compression, names_conditions, params, chunk_size, previous_names))
+    entry["seconds"] = round(time.monotonic() - started, 2)
+    return entry
+
+def export_doctype_snapshot(doctype, backup_dir, compression="none", chunk_size=CHUNK_SIZE, snapshot_at=None, since=None, previous_names=None, output_format="ndjson"):
+    """
+    Export `doctype` inside its own consistent snapshot, for backup workers with their
+    own connection. Rows created after `snapshot_at` (the start of the backup) are left
+    out, so every worker cuts the data at the same point in time.
+    """
+    start_snapshot()
+    try:
+        return export_backup_entry(doctype, backup_dir, compression, chunk_size, snapshot_at, since, previous_names, output_format)
+    finally:
+        frappe.db.rollback()
+
+def init_worker(site):
+    """Process pool initializer, every backup worker keeps its own site connection."""
+    frappe.init(site=site)
+    frappe.connect()
+
+def estimate_rows(doctypes):
+    """Approximate row counts from the table statistics, to start the largest doctypes first."""
+    if not doctypes:
+        return {}
+    rows = frappe.db.sql("""
+        SELECT table_name, table_rows FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name IN %(tables)s
+    """, {"tables": tuple(f"tab{doctype}" for doctype in doctypes)})
+    return {table[3:]: count or 0 for table, count in rows}
+
+def open_backup_file(path):
+    """Open a backup file for reading as text, decompressing by extension."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".zst"):
+        if not zstandard:
+            raise ValueError(f"Reading {os.path.basename(path)} needs the 'zstandard' package")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, "rb")), encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+def iter_backup_rows(path, names=None):
+    """
+    Rows of an NDJSON backup file, a compact backup index or a legacy JSON list backup.
+    With `names`, only the documents with those names.
+    """
+    if is_compact_index(path):
+        yield from iter_compact_rows(path, names)
+        return
+
+    names = {str(name) for name in names} if names is not None else None
+    with open_backup_file(path) as f:
+        if path.endswith(".json"):
+            rows = json.load(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+
+        for row in rows:
+            if names is None or str(row.get("name")) in names:
+                yield row
+
+def file_checksum(path, block_size=1 << 20):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def manifest_files(manifest):
+    """Every file entry ({"file", "sha256", "bytes"}) recorded in a manifest."""
+    for entry in manifest["doctypes"].values():
+        yield entry
+        for key in ("names", "deleted"):
+            if key in entry:
+                yield entry[key]
+        yield from entry.get("chunks", [])
+
+def write_manifest(backup_dir, manifest):
+    with open(os.path.join(backup_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=4, default=json_handler)
+
+def read_manifest(backup_dir):
+    path = os.path.join(backup_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def get_backup_files(backup_dir):
+    """
+    [(doctype, path)] of a backup directory, from its manifest or,
+    for backups taken before manifests existed, from its `<doctype>.json` files.
+    """
+    manifest = read_manifest(backup_dir)
+    if manifest:
+        return [
+            (doctype, os.path.join(backup_dir, entry["file"]))
+            for doctype, entry in manifest["doctypes"].items()
+        ]
+
+    return [
+        (f[:-len(".json")], os.path.join(backup_dir, f))
+        for f in sorted(os.listdir(backup_dir))
+        if f.endswith(".json") and f != MANIFEST_FILE
+    ]
+
+def list_backups(app_dir):
+    """Backup directories of an app, oldest first."""
+    if not os.path.isdir(app_dir):
+        return []
+    return sorted(d for d in os.listdir(app_dir) if os.path.isdir(os.path.join(app_dir, d)))
+
+def latest_manifest_backup(app_dir):
+    """Most recent backup directory of the app that has a manifest, or None."""
+    for backup in reversed(list_backups(app_dir)):
+        backup_dir = os.path.join(app_dir, backup)
+        if read_manifest(backup_dir):
+            return backup_dir
+    return None
+
+def get_backup_chain(backup_dir):
+    """
+    Directories to restore in order for `backup_dir`: its base full backup
+    followed by every incremental backup up to and including `backup_dir`.
+    """
+    chain = [backup_dir]
+    manifest = read_manifest(backup_dir)
+
+    while manifest and manifest.get("type") == "incremental":
+        parent_dir = os.path.join(os.path.dirname(os.path.normpath(chain[0])), manifest["parent"])
+        if not os.path.isdir(parent_dir):
+            raise ValueError(f"Backup {manifest['parent']} in the chain of {os.path.basename(backup_dir)} is missing")
+        chain.insert(0, parent_dir)
+        manifest = read_manifest(parent_dir)
+
+    return chain
+
+INSERT_BATCH = 500
+CHECKPOINT_FILE = ".restore-checkpoint.json"
+
+@contextmanager
+def bulk_load_session():
+    """
+    Skip unique and foreign key checks while loading rows that were already
+    consistent in the table they were backed up from. Primary keys are still checked.
+
+    Only for loading into a table that was emptied first (full restores): InnoDB does
+    not guarantee duplicates against existing rows are caught with unique_checks off,
+    so replacing documents in a populated table must run with the checks on.
+    """
+    frappe.db.sql("SET SESSION unique_checks = 0")
+    frappe.db.sql("SET SESSION foreign_key_checks = 0")
+    try:
+        yield
+    finally:
+        frappe.db.sql("SET SESSION unique_checks = 1")
+        frappe.db.sql("SET SESSION foreign_key_checks = 1")
+
+def insert_rows(doctype, rows, columns=None, batch_size=INSERT_BATCH, on_error=None):
+    """
+    Insert backed up rows into `tab<doctype>` with multi-row INSERTs, grouping rows by
+    their column set. Keys that are not columns of the table (like `child_tables`) are
+    dropped. A failing batch is retried row by row, passing each failing row and error
+    to `on_error`. Returns the number of rows inserted.
+    """
+    columns = columns or set(frappe.db.get_table_columns(doctype))
+
+    groups = {}
+    for row in rows:
+        data = {key: value for key, value in row.items() if key in columns}
+        if data:
+            groups.setdefault(tuple(data), []).append(tuple(data.values()))
+
+    inserted = 0
+    for fields, values in groups.items():
+        column_list = ", ".join(f"`{field}`" for field in fields)
+        placeholders = "(" + ", ".join(["%s"] * len(fields)) + ")"
+
+        for batch in chunked(values, batch_size):
+            try:
+                frappe.db.sql(
+                    f"INSERT INTO `tab{doctype}` ({column_list}) VALUES {', '.join([placeholders] * len(batch))}",
+                    tuple(value for row in batch for value in row)
+                )
+                inserted += len(batch)
+            except Exception:
+                for row in batch:
+                    try:
+                        frappe.db.sql(f"INSERT INTO `tab{doctype}` ({column_list}) VALUES {placeholders}", row)
+                        inserted += 1
+                    except Exception as e:
+                        if on_error:
+                            on_error(dict(zip(fields, row)), e)
+
+    return inserted
+
+def delete_documents(doctype, names, size=CHUNK_SIZE):
+    """Delete rows of `tab<doctype>` by name in bounded `name IN` chunks, returns the count."""
+    deleted = 0
+    for chunk in chunked(names, size):
+        frappe.db.sql(f"DELETE FROM `tab{doctype}` WHERE name IN %(names)s", {"names": tuple(chunk)})
+        deleted += len(chunk)
+    return deleted
+
+def get_document_children(doc, child_tables):
+    """
+    Child rows of a backed up document by child doctype, from `child_tables` or,
+    in backup-doctype files, from keys named after the child doctype.
+    """
+    embedded = doc.get("child_tables") or {}
+    return {
+        child_table: embedded.get(child_table, doc.get(child_table)) or []
+        for child_table in child_tables
+    }
+
+def insert_children(docs, child_tables, on_error=None):
+    """Batched inserts of the child rows of a chunk of backed up parents, returns {child doctype: rows}."""
+    rows_by_table = {child_table: [] for child_table in child_tables}
+    for doc in docs:
+        for child_table, rows in get_document_children(doc, child_tables).items():
+            rows_by_table[child_table].extend(rows)
+
+    return {
+        child_table: insert_rows(child_table, rows, on_error=on_error)
+        for child_table, rows in rows_by_table.items()
+    }
+
+def delete_children(doctype, child_tables, names=None, size=CHUNK_SIZE):
+    """
+    Delete the child rows of `doctype` parents with one statement per child doctype,
+    for the given parent names (in `parent IN` chunks) or for every parent.
+    """
+    for child_table in child_tables:
+        if names is None:
+            frappe.db.sql(f"DELETE FROM `tab{child_table}` WHERE parenttype = %(parenttype)s", {"parenttype": doctype})
+            continue
+
+        for chunk in chunked(names, size):
+            frappe.db.sql(f"""
+                DELETE FROM `tab{child_table}`
+                WHERE parenttype = %(parenttype)s AND parent IN %(names)s
+            """, {"parenttype": doctype, "names": tuple(chunk)})
+
+def insert_documents(doctype, docs, child_tables, columns=None, on_error=None, bulk_load=False):
+    """
+    Insert a chunk of backed up parents, then the child rows of the parents that were
+    inserted, so a parent rejected by `on_error` leaves no orphaned child rows.
+    With `bulk_load` (parent table emptied first), the parents are inserted inside
+    `bulk_load_session`. Child tables also hold rows of other parents, so their
+    inserts always run with the checks on.
+    Returns (parents inserted, {child doctype: rows inserted}).
+    """
+    failed = set()
+
+    def on_parent_error(row, error):
+        failed.add(row.get("name"))
+        if on_error:
+            on_error(row, error)
+
+    if bulk_load:
+        with bulk_load_session():
+            inserted = insert_rows(doctype, docs, columns, on_error=on_parent_error)
+    else:
+        inserted = insert_rows(doctype, docs, columns, on_error=on_parent_error)
+
+    counts = insert_children([doc for doc in docs if doc.get("name") not in failed], child_tables, on_error=on_error)
+    return inserted, counts
+
+def get_embedded_child_tables(doctypes):
+    """Child doctypes whose rows are backed up inside the files of `doctypes`."""
+    embedded = set()
+    for doctype in doctypes:
+        if frappe.db.exists("DocType", doctype):
+            embedded.update(get_child_tables(doctype))
+    return embedded
+
+class RestoreCheckpoint:
+    """
+    Progress of a restore, saved after every committed chunk so an interrupted
+    restore can resume: {step: {doctype: {"rows": committed rows, "done": bool}}}.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.state = {}
+        if resume and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def get(self, step, doctype):
+        return self.state.get(step, {}).get(doctype) or {"rows": 0, "done": False}
+
+    def update(self, step, doctype, rows, done=False):
+        self.state.setdefault(step, {})[doctype] = {"rows": rows, "done": done}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -1,150 +1,185 @@
 from __future__ import unicode_literals, absolute_import
-import os
+import time
 import click
 import frappe
-import subprocess
-import sys
-import traceback
-import importlib.util
 
 from termcolor import colored
+from core.commands.backup_app import create_backup
+from core.commands.backup_utils import (
+    CHUNK_SIZE, delete_children, delete_documents, get_app_doctypes, get_child_tables,
+    get_embedded_child_tables, iter_chunks
+)
 
-def get_app_doctypes(appname):
+def throttle(started, count, rate=None):
+    """Sleep so that `count` rows handled since `started` stay under `rate` rows per second."""
+    if rate:
+        remaining = count / rate - (time.monotonic() - started)
+        if remaining > 0:
+            time.sleep(remaining)
+
+def delete_doctype_documents(doctype, child_tables, chunk_size=CHUNK_SIZE, rate=None):
     """
-    Retrieve all doctypes for a given app.
+    Delete every document of `doctype` and its child rows in bounded primary key chunks,
+    committing after each chunk, then any child rows left without a parent.
+    `rate` caps the rows deleted per second. Returns the number of documents deleted.
     """
-    try:
-        # Get all modules for the app
-        app_modules = frappe.get_module_list(appname)
-        
-        # Find doctypes in these modules
-        doctypes = []
-        for module in app_modules:
-            module_doctypes = frappe.get_list("DocType", 
-                filters={"module": module}, 
-                pluck="name"
-            )
-            doctypes.extend(module_doctypes)
-        
-        return doctypes
-    except Exception as e:
-        click.echo(colored(f"Error finding doctypes for app '{appname}': {e}", 'black', 'on_red'))
-        return []
+    deleted = 0
+    for rows in iter_chunks(doctype, chunk_size=chunk_size, fields="name"):
+        started = time.monotonic()
+        names = [row["name"] for row in rows]
+
+        delete_children(doctype, child_tables, names, size=chunk_size)
+        deleted += delete_documents(doctype, names, size=chunk_size)
+        frappe.db.commit()
 
-def delete_app_documents(appname, site=None):
+        # Throttle so replicas and other transactions keep up
+        throttle(started, len(names), rate)
+
+    # Orphaned child rows of this doctype, that no parent chunk matched
+    for child_table in child_tables:
+        while True:
+            started = time.monotonic()
+            orphans = frappe.db.sql_list(f"""
+                SELECT name FROM `tab{child_table}`
+                WHERE parenttype = %(parenttype)s
+                LIMIT {int(chunk_size)}
+            """, {"parenttype": doctype})
+            if not orphans:
+                break
+
+            delete_documents(child_table, orphans, size=chunk_size)
+            frappe.db.commit()
+            throttle(started, len(orphans), rate)
+
+    return deleted
+
+def delete_app_documents(appname, chunk_size=CHUNK_SIZE, rate=None):
     """
-    Delete all documents for doctypes in the specified app.
+    Delete all documents for doctypes in the specified app on the connected site.
     """
-    try:
-        # Determine the site
-        if not site:
-            try:
-                with open('currentsite.txt', 'r') as f:
-                    site = f.read().strip()
-            except FileNotFoundError:
-                click.echo(colored("Error: currentsite.txt not found and no site provided.", 'black', 'on_red'))
-                return False
+    # Get doctypes for the app
+    doctypes = get_app_doctypes(appname)
 
-        # Initialize Frappe and connect to the site
-        frappe.init(site=site)
-        frappe.connect()
+    if not doctypes:
+        print(f"No doctypes found for app '{appname}'.")
+        return False
 
-        # Get doctypes for the app
-        doctypes = get_app_doctypes(appname)
+    # Child rows are deleted with their parents
+    embedded = get_embedded_child_tables(doctypes)
+    success = True
 
-        if not doctypes:
-            print(f"No doctypes found for app '{appname}'.")
-            return False
+    # Delete documents for each doctype
+    for doctype in doctypes:
+        if doctype in embedded:
+            continue
 
-        # Delete documents for each doctype
-        for doctype in doctypes:
-            try:
-                frappe.db.delete(doctype)
+        try:
+            meta = frappe.get_meta(doctype)
+            if getattr(meta, "is_virtual", 0):
+                continue
+
+            if meta.issingle:
+                frappe.db.delete("Singles", {"doctype": doctype})
+                frappe.db.commit()
                 print(f"Deleted all documents for doctype: {doctype}")
-            except Exception as doctype_error:
-                click.echo(colored(f"Error deleting documents for doctype {doctype}: {doctype_error}", 'black', 'on_red'))
+                continue
 
-        # Commit changes
-        frappe.db.commit()
-        frappe.destroy()
-        
-        return True
+            deleted = delete_doctype_documents(doctype, get_child_tables(doctype), chunk_size, rate)
+            print(f"Deleted {deleted} documents for doctype: {doctype}")
+        except Exception as doctype_error:
+            success = False
+            frappe.db.rollback()
+            click.echo(colored(f"Error deleting documents for doctype {doctype}: {doctype_error}", 'black', 'on_red'))
 
-    except Exception as e:
-        click.echo(colored(f"Error deleting app documents: {e}", 'black', 'on_red'))
-        return False
+    return success
 
 @click.command('delete-app')
 @click.option('--site', default=None, type=str, help='Specify the site name (optional). If not provided, uses the current site.')
 @click.argument('appname')
-@click.option('--backup/--no-backup', default=True, 
+@click.option('--backup/--no-backup', default=True,
               prompt='Do you want to take a backup before deleting?',
               help='Take a backup before deleting app documents. Default is to create a backup.')
-def delete_app(site, appname, backup):
+@click.option('--chunk-size', default=CHUNK_SIZE, type=click.IntRange(min=1), help=f'Documents deleted per transaction (default: {CHUNK_SIZE}).')
+@click.option('--rate', default=None, type=click.IntRange(min=1), help='Maximum documents deleted per second (optional, no limit by default).')
+def delete_app(site, appname, backup, chunk_size, rate):
     """
     Permanently delete all documents for a specific app with optional backup.
-    
+
     This command provides a comprehensive and safe document deletion mechanism:
-    
+
     Key Features:
     - Mandatory pre-deletion backup confirmation
     - Site-specific document management
     - Granular, doctype-level deletion
-    - Atomic transaction with database commit
-    
+    - Bounded transactions: documents are deleted in primary key chunks, one commit per chunk
+    - Optional rate limit to keep replication and other users unaffected
+
     Deletion Workflow:
     1. Prompt for backup confirmation (default: yes)
-    2. Create a comprehensive backup of all app documents
+    2. Create a comprehensive backup of all app documents (same as backup-app)
     3. Identify all doctypes associated with the specified app
-    4. Systematically delete documents for each doctype
-    5. Commit changes to the database
-    
+    4. Delete documents for each doctype chunk by chunk, with their child rows
+    5. Commit each chunk to the database
+
     Safety Mechanisms:
     - Backup creation prevents irreversible data loss
     - Explicit user confirmation required
     - Supports disabling backup with --no-backup flag
-    
+    - Deletion is aborted when any doctype fails to back up
+
     Potential Use Cases:
     - Cleaning up test or deprecated app data
     - Preparing for app reinstallation
     - Managing development environment
-    
+
     Performance Considerations:
     - Deletion process scales with the number of doctypes
     - Larger apps may require more time to process
-    
+    - Smaller --chunk-size values hold locks for less time, --rate spreads the load
+
     Examples:
     \b
     - bench delete-app core                  # Delete with backup
     - bench delete-app core --site mysite    # Delete on specific site
     - bench delete-app core --no-backup      # Delete without backup
-    
+    - bench delete-app core --chunk-size 500 --rate 2000
+
     ⚠️ WARNING: Irreversible operation. Use with extreme caution.
     """
+    # Determine the site
+    if not site:
+        try:
+            with open('currentsite.txt', 'r') as f:
+                site = f.read().strip()
+        except FileNotFoundError:
+            click.echo(colored("Error: currentsite.txt not found and no site provided.", 'black', 'on_red'))
+            return
+
+    # Initialize Frappe and connect to the site
     try:
-        # Backup if requested
+        frappe.init(site=site)
+        frappe.connect()
+    except Exception as e:
+        click.echo(colored(f"Error initializing Frappe for site '{site}': {e}", 'black', 'on_red'))
+        return
+
+    try:
+        # Backup if requested, in this process with the streaming exporter
         if backup:
             try:
-                # Use subprocess to run backup-app command
-                backup_result = subprocess.run(
-                    ['bench', 'backup-app', appname], 
-                    capture_output=True, 
-                    text=True
-                )
-                
-                if backup_result.returncode != 0:
-                    click.echo(colored("Backup failed. Aborting deletion.", 'black', 'on_red'))
-                    click.echo(colored(backup_result.stderr, 'black', 'on_red'))
-                    return
-                
-                click.echo(colored("Backup completed successfully.", 'black', 'on_green'))
-            
+                backup_dir, manifest = create_backup(appname, site)
             except Exception as backup_error:
                 click.echo(colored(f"Error during backup: {backup_error}", 'black', 'on_red'))
                 return
 
+            if manifest["errors"]:
+                click.echo(colored("Backup failed. Aborting deletion.", 'black', 'on_red'))
+                return
+
+            click.echo(colored(f"Backup completed successfully at {backup_dir}.", 'black', 'on_green'))
+
         # Delete app documents
-        deletion_success = delete_app_documents(appname, site)
+        deletion_success = delete_app_documents(appname, chunk_size, rate)
 
         if deletion_success:
             click.echo(colored(f"Successfully deleted all documents for app '{appname}'", 'black', 'on_green', attrs=['bold']))
@@ -153,5 +188,7 @@ def delete_app(site, appname, backup):
 
     except Exception as e:
         click.echo(colored(f"Unexpected error: {e}", 'black', 'on_red'))
+    finally:
+        frappe.destroy()
 
 commands = [delete_app]
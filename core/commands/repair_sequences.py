@@ -0,0 +1,59 @@
+from __future__ import unicode_literals, absolute_import
+import click
+import frappe
+from termcolor import colored
+from core.series import repair_sequences as repair
+
+@click.command('repair-sequences')
+@click.option('--site', default=None, type=str, help='Specify the site name (optional). If not provided, uses the current site.')
+@click.option('--reset', is_flag=True, default=False, help='Also move counters that are ahead of the existing codes back to the highest code in use.')
+def repair_sequences(site, reset):
+    """
+    Reconcile the facility and project code sequences with existing data.
+
+    This command:
+    - Finds the highest F#### facility code and P#### project detail code in use.
+    - Moves each sequence counter forward to it when the counter is behind.
+    - With --reset, also moves counters back to close gaps left by rolled back inserts.
+
+    Examples:
+    \b
+    - bench repair-sequences
+    - bench repair-sequences --reset
+    - bench repair-sequences --site {sitename}
+    """
+    # Determine the site
+    if not site:
+        try:
+            with open('currentsite.txt', 'r') as f:
+                site = f.read().strip()
+        except FileNotFoundError:
+            click.echo(colored("Error: currentsite.txt not found and no --site provided.", 'black', 'on_red'))
+            return
+
+    # Initialize Frappe and connect to the site
+    try:
+        frappe.init(site=site)
+        frappe.connect()
+    except Exception as e:
+        click.echo(colored(f"Error initializing Frappe for site '{site}': {e}", 'black', 'on_red'))
+        return
+
+    try:
+        report = repair(reset=reset)
+        frappe.db.commit()
+
+        for sequence, (before, after) in report.items():
+            if before == after:
+                click.echo(colored(f"{sequence}: counter at {after}, nothing to repair.", 'green'))
+            else:
+                click.echo(colored(f"{sequence}: counter moved from {before if before is not None else 'unset'} to {after}.", 'yellow'))
+
+        click.echo(colored("Sequence repair completed.", 'black', 'on_green'))
+    except Exception as e:
+        frappe.db.rollback()
+        click.echo(colored(f"Error repairing sequences: {e}", 'black', 'on_red'))
+    finally:
+        frappe.destroy()
+
+commands = [repair_sequences]
@@ -1,14 +1,16 @@
 from __future__ import unicode_literals, absolute_import
 import os
-import json
 import click
 import frappe
-from datetime import datetime
-import sys
 import traceback
-import importlib.util
+from itertools import islice
 
 from termcolor import colored
+from core.commands.backup_utils import (
+    CHECKPOINT_FILE, RestoreCheckpoint, chunked, delete_children,
+    delete_documents, get_backup_chain, get_backup_files, get_child_tables,
+    get_embedded_child_tables, insert_documents, iter_backup_rows, read_manifest
+)
 
 def get_doctype_module(doctype):
     
@@ -24,73 +26,92 @@ def get_doctype_module(doctype):
         click.echo(colored(f"Error finding module for doctype {doctype}: {e}", 'black', 'on_red'))
         return None
 
-def prepare_sql_insert(table_name, data):
-    
-    # Remove None values and child_tables
-    data = {k: v for k, v in data.items() if v is not None and k != 'child_tables'}
-    
-    columns = ', '.join([f"`{col}`" for col in data.keys()])
-    placeholders = ', '.join(['%s'] * len(data))
-    values = tuple(data.values())
-    
-    query = f"INSERT INTO `{table_name}` ({columns}) VALUES ({placeholders})"
-    return query, values
+def restore_documents(docs, doctype, verbose=False, replace=False, on_chunk=None, child_tables=(), child_counts=None, bulk_load=False):
+    """
+    Bulk insert documents and the child rows under their `child_tables` with multi-row
+    INSERTs, committing after every chunk. Child rows of documents that fail to insert
+    are skipped.
+    With `replace`, documents with the same names and their child rows are deleted first
+    (incremental backups).
+    `on_chunk` is called after each commit with the number of documents processed so far.
+    Restored child rows are counted per child doctype in `child_counts`.
+    `bulk_load` skips unique and foreign key checks for the parent rows, only for a
+    parent table that was emptied first.
+    """
+    columns = set(frappe.db.get_table_columns(doctype))
+
+    def on_error(row, error):
+        if verbose:
+            click.echo(colored(f"Error inserting parent document {row.get('name')}: {error}", 'black', 'on_red'))
+
+    restored_count = processed = 0
+    for chunk in chunked(docs):
+        if replace:
+            names = [doc.get('name') for doc in chunk]
+            delete_children(doctype, child_tables, names)
+            delete_documents(doctype, names)
+
+        # Parents first, then the child rows of the parents that were inserted
+        inserted, counts = insert_documents(doctype, chunk, child_tables, columns, on_error=on_error, bulk_load=bulk_load)
+        restored_count += inserted
+        if child_counts is not None:
+            for child_table, count in counts.items():
+                child_counts[child_table] = child_counts.get(child_table, 0) + count
+        frappe.db.commit()
+
+        processed += len(chunk)
+        if on_chunk:
+            on_chunk(processed)
+        if verbose:
+            click.echo(colored(f"Restored {processed} documents of doctype '{doctype}'", 'green'))
 
-def restore_documents(docs, doctype, verbose=False):
-    
-    restored_count = 0
-    
-    # Determine table names
-    parent_table = f"tab{doctype}"
-    
-    # Restore parent documents
-    for doc in docs:
-        try:
-            # Prepare parent document data
-            parent_doc = doc.copy()
-            
-            # Prepare SQL insert
-            insert_query, insert_values = prepare_sql_insert(parent_table, parent_doc)
-            
-            try:
-                # Execute direct SQL insert
-                frappe.db.sql(insert_query, insert_values)
-                
-                restored_count += 1
-                
-                if verbose:
-                    click.echo(colored(f"Restored parent document: {doc.get('name')}", 'green'))
-            
-            except Exception as insert_error:
-                if verbose:
-                    click.echo(colored(f"Error inserting parent document: {insert_error}", 'black', 'on_red'))
-        
-        except Exception as e:
-            if verbose:
-                click.echo(colored(f"Error processing parent document: {e}", 'black', 'on_red'))
-    
     return restored_count
 
+def apply_incremental(docs, doctype, deleted_names, verbose=False, on_chunk=None, child_tables=(), child_counts=None):
+    """
+    Apply one incremental backup of `doctype`: delete the documents (and child rows)
+    deleted since the previous backup, then replace the changed documents.
+    Returns (documents restored, documents deleted).
+    """
+    delete_children(doctype, child_tables, deleted_names)
+    deleted_count = delete_documents(doctype, deleted_names)
+    frappe.db.commit()
+
+    restored_count = restore_documents(
+        docs, doctype, verbose, replace=True, on_chunk=on_chunk,
+        child_tables=child_tables, child_counts=child_counts
+    )
+    return restored_count, deleted_count
+
 @click.command('restore-app')
 @click.option('--site', default=None, type=str, help='Specify the site name (optional). If not provided, uses the current site.')
 @click.option('--verbose', is_flag=True, help='Enable verbose logging for detailed troubleshooting.')
+@click.option('--resume', is_flag=True, help='Continue an interrupted restore from its checkpoint instead of starting over.')
 @click.argument('appname', type=str)
 @click.argument('backup_path', default=None, required=False, type=str)
-def restore_app(site, verbose, appname, backup_path=None):
+def restore_app(site, verbose, resume, appname, backup_path=None):
     """
     Restore documents for a specific app from a backup.
     
     This command restores all documents for the specified app from a backup.
     It supports:
     - Automatic selection of the most recent backup if no path is specified
+    - Incremental backups, replayed on top of their base full backup
     - Optional verbose logging for detailed troubleshooting
+    - Bulk loading with multi-row INSERTs and a commit per chunk
+    - Resuming an interrupted restore with --resume
     - Site-specific restoration
     
     Restoration process:
     1. Locates the backup directory or specified backup path
-    2. Clears existing documents for each doctype in the app
-    3. Restores documents from the backup JSON files
-    4. Commits changes to the database
+    2. Clears existing documents for each doctype in the app, with their child rows
+    3. Restores documents from the backup files (NDJSON, compressed NDJSON or legacy JSON)
+       For an incremental backup, restores its base full backup and then applies each
+       incremental backup of the chain in order (deletions, then changed documents)
+       Child rows are restored with their parents in batched inserts, so the standalone
+       files of child doctypes embedded in a parent's file are skipped
+    4. Commits every chunk of documents and records it in .restore-checkpoint.json
+       in the backup directory, removed once every doctype is restored
     
     Backup location searched: ./backup/<appname>/
     
@@ -100,6 +121,7 @@ def restore_app(site, verbose, appname, backup_path=None):
     - bench restore-app core --site mysite
     - bench restore-app core --verbose
     - bench restore-app core /path/to/specific/backup
+    - bench restore-app core --resume
     """
     # Determine the site
     if not site:
@@ -141,36 +163,95 @@ def restore_app(site, verbose, appname, backup_path=None):
         frappe.destroy()
         return
 
-    # Fetch all JSON files in the backup directory
-    backup_files = [f for f in os.listdir(backup_path) if f.endswith('.json')]
+    # Base full backup first, then every incremental backup up to the selected one
+    try:
+        chain = get_backup_chain(backup_path)
+    except ValueError as e:
+        click.echo(colored(f"Error: {e}", 'black', 'on_red'))
+        frappe.destroy()
+        return
 
-    # Restore documents for each doctype
-    for backup_file in backup_files:
-        doctype = backup_file.replace('.json', '')
-        try:
-            # Read the backup file
-            with open(os.path.join(backup_path, backup_file), 'r') as f:
-                parent_docs = json.load(f)
-
-            # Find the module for the doctype
-            module = get_doctype_module(doctype)
-            if not module:
-                click.echo(colored(f"Warning: Could not find module for doctype '{doctype}'. Skipping.", 'yellow'))
+    # Progress is saved after every committed chunk, --resume continues from it
+    checkpoint = RestoreCheckpoint(os.path.join(backup_path, CHECKPOINT_FILE), resume)
+    failed = False
+
+    for chain_dir in chain:
+        manifest = read_manifest(chain_dir) or {}
+        incremental = manifest.get("type") == "incremental"
+        step = os.path.basename(os.path.normpath(chain_dir))
+        if len(chain) > 1:
+            click.echo(colored(f"Restoring {'incremental' if incremental else 'full'} backup {step}", 'cyan'))
+
+        # Backup files from the manifest, or the JSON files of older backups
+        backup_files = get_backup_files(chain_dir)
+
+        # Child rows are restored with their parents, skip the standalone files of those child doctypes
+        embedded = get_embedded_child_tables([doctype for doctype, _ in backup_files])
+
+        for doctype, backup_file in backup_files:
+            if doctype in embedded:
+                continue
+
+            state = checkpoint.get(step, doctype)
+            if state["done"]:
+                click.echo(f"Skipping doctype '{doctype}', already restored")
                 continue
 
-            # Clear existing documents for the doctype before restoring
-            frappe.db.delete(doctype)
+            try:
+                # Find the module for the doctype
+                module = get_doctype_module(doctype)
+                if not module:
+                    click.echo(colored(f"Warning: Could not find module for doctype '{doctype}'. Skipping.", 'yellow'))
+                    continue
+
+                # Stream the rows of the backup file, after those already committed
+                parent_docs = islice(iter_backup_rows(backup_file), state["rows"], None)
+                progress = {"rows": state["rows"]}
+                child_tables = get_child_tables(doctype)
+                child_counts = {}
+
+                def save_progress(processed, step=step, doctype=doctype, start=state["rows"]):
+                    progress["rows"] = start + processed
+                    checkpoint.update(step, doctype, progress["rows"])
+
+                if incremental:
+                    # Apply the deletions, then replace the changed documents
+                    deleted = manifest["doctypes"][doctype].get("deleted")
+                    deleted_names = list(iter_backup_rows(os.path.join(chain_dir, deleted["file"]))) if deleted else []
+                    restored_count, deleted_count = apply_incremental(
+                        parent_docs, doctype, deleted_names, verbose, on_chunk=save_progress,
+                        child_tables=child_tables, child_counts=child_counts
+                    )
+                    print(f"Restored {restored_count} and deleted {deleted_count} documents for doctype '{doctype}'")
+                else:
+                    # Clear existing documents and their child rows before restoring, unless resuming
+                    if not state["rows"]:
+                        delete_children(doctype, child_tables)
+                        frappe.db.delete(doctype)
+
+                    # The parent table was emptied, so its rows skip the unique and foreign key checks
+                    restored_count = restore_documents(
+                        parent_docs, doctype, verbose, on_chunk=save_progress,
+                        child_tables=child_tables, child_counts=child_counts, bulk_load=True
+                    )
+                    print(f"Restored {restored_count} documents for doctype '{doctype}'")
+
+                for child_table, count in child_counts.items():
+                    print(f"  Restored {count} rows of child table '{child_table}'")
 
-            # Restore documents with direct SQL
-            restored_count = restore_documents(parent_docs, doctype, verbose)
+                checkpoint.update(step, doctype, progress["rows"], done=True)
 
-            print(f"Restored {restored_count} documents for doctype '{doctype}'")
+            except Exception as e:
+                failed = True
+                frappe.db.rollback()
+                click.echo(colored(f"Error processing doctype '{doctype}': {e}", 'black', 'on_red'))
+                # Print full traceback for debugging
+                traceback.print_exc()
 
-        except Exception as e:
-            click.echo(colored(f"Error processing doctype '{doctype}': {e}", 'black', 'on_red'))
-            # Print full traceback for debugging
-            import traceback
-            traceback.print_exc()
+    if not failed:
+        checkpoint.clear()
+    else:
+        click.echo(colored("Some doctypes failed, run again with --resume to continue after fixing them.", 'yellow'))
 
     # Commit changes
     frappe.db.commit()
@@ -1,28 +1,37 @@
 from __future__ import unicode_literals, absolute_import
 import os
-import json
 import click
 import frappe
-from datetime import datetime
 from termcolor import colored
+from core.commands.backup_utils import (
+    chunked, delete_children, delete_documents, get_backup_files, get_child_tables,
+    insert_documents, iter_backup_rows, read_manifest
+)
 
 @click.command('restore-doctype')
 @click.option('--site', default=None, type=str, help='Specify the site name (optional). If not provided, uses the current site.')
 @click.argument('doctype', type=str)
 @click.argument('backup_file', required=False, type=str)
-def restore_doctype(site, doctype, backup_file):
+@click.option('--name', 'names', multiple=True, help='Only restore the document with this name (repeatable).')
+def restore_doctype(site, doctype, backup_file, names):
     """
     Restore the latest backup of a specific Doctype.
 
     This command:
     - Identifies the latest backup file for the specified Doctype.
-    - Restores the documents from the backup file into the database.
+    - Restores the documents and their child rows from the backup file into the database,
+      replacing existing documents with the same names.
+    - Streams the file and restores it in chunks with multi-row INSERTs, one commit per chunk.
+    - Restores only the given documents with --name. Compact backups (backup-doctype or
+      backup-app --format compact) only decompress the chunks holding those documents.
 
     Examples:
     \b
     - bench restore-doctype {doctype}
     - bench restore-doctype {doctype} {filename}
     - bench restore-doctype {doctype} --site {sitename}
+    - bench restore-doctype {doctype} {compact backup directory} --name {name}
+    - bench restore-doctype {doctype} /path/to/backup/<app>/<timestamp> --name {name}
     """
     # Determine the site
     if not site:
@@ -49,7 +58,11 @@ def restore_doctype(site, doctype, backup_file):
         return
 
     try:
-        backup_files = [f for f in os.listdir(backup_dir) if f.endswith('.json')]
+        # Backup files, and the directories of compact backups
+        backup_files = [
+            f for f in os.listdir(backup_dir)
+            if f.endswith(('.json', '.ndjson')) or read_manifest(os.path.join(backup_dir, f))
+        ]
         if not backup_files:
             click.echo(colored(f"Error: No backup files found for Doctype '{doctype}'.", 'black', 'on_red'))
             frappe.destroy()
@@ -66,20 +79,39 @@ def restore_doctype(site, doctype, backup_file):
             latest_backup = max(backup_files, key=lambda f: os.path.getmtime(os.path.join(backup_dir, f)))
             latest_backup_path = os.path.join(backup_dir, latest_backup)
 
-        # Load the backup data
-        with open(latest_backup_path, 'r') as f:
-            documents = json.load(f)
+        # Backup directories (compact or backup-app) hold one file or index per doctype
+        if os.path.isdir(latest_backup_path):
+            doctype_files = dict(get_backup_files(latest_backup_path))
+            if doctype not in doctype_files:
+                click.echo(colored(f"Error: Backup '{latest_backup_path}' has no data for Doctype '{doctype}'.", 'black', 'on_red'))
+                frappe.destroy()
+                return
+            source_path = doctype_files[doctype]
+        else:
+            source_path = latest_backup_path
+
+        # Stream the backup and replace its documents chunk by chunk: existing documents
+        # with the same names are deleted, then parents and child rows are bulk inserted
+        columns = set(frappe.db.get_table_columns(doctype))
+        child_tables = get_child_tables(doctype)
+        restored_count = 0
+
+        def on_error(row, error):
+            click.echo(colored(f"Error restoring document {row.get('name')}: {error}", 'black', 'on_red'))
 
-        # Restore documents into the database
-        for doc in documents:
-            if frappe.db.exists(doctype, doc.get('name')):
-                frappe.db.set_value(doctype, doc.get('name'), doc)
-            else:
-                frappe.get_doc(doc).insert()
+        # The table keeps its other documents, so unique checks stay on
+        for chunk in chunked(iter_backup_rows(source_path, names or None)):
+            chunk_names = [doc.get('name') for doc in chunk]
+            delete_children(doctype, child_tables, chunk_names)
+            delete_documents(doctype, chunk_names)
+            inserted, _ = insert_documents(doctype, chunk, child_tables, columns, on_error=on_error)
+            restored_count += inserted
+            frappe.db.commit()
 
-        frappe.db.commit()
+        click.echo(f"Restored {restored_count} documents")
         click.echo(colored(f"Restore completed for Doctype '{doctype}' from backup '{os.path.basename(latest_backup_path)}'.", 'black', 'on_green'))
     except Exception as e:
+        frappe.db.rollback()
         click.echo(colored(f"Error restoring Doctype '{doctype}': {e}", 'black', 'on_red'))
     finally:
         frappe.destroy()
@@ -0,0 +1,125 @@
+# Copyright (c) 2025, Agnikul Cosmos Private Limited and Contributors
+# See license.txt
+
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+from frappe.tests.utils import FrappeTestCase
+
+from core.commands.backup_utils import (
+	BackupWriter, decode_chunk, encode_chunk, file_checksum, iter_backup_rows, iter_chunks,
+	keyset_condition
+)
+
+
+class SQLiteDB:
+	"""Runs the queries of `iter_chunks` against an in-memory table."""
+
+	def __init__(self, rows):
+		self.connection = sqlite3.connect(":memory:")
+		self.connection.row_factory = sqlite3.Row
+		self.connection.execute("CREATE TABLE `tabNote` (name TEXT PRIMARY KEY, creation TEXT)")
+		self.connection.executemany("INSERT INTO `tabNote` VALUES (:name, :creation)", rows)
+
+	def sql(self, query, params=None, as_dict=False):
+		query = re.sub(r"%\((\w+)\)s", r":\1", query)
+		return [dict(row) for row in self.connection.execute(query, params or {})]
+
+
+class TestBackupUtils(FrappeTestCase):
+	def setUp(self):
+		self.backup_dir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.backup_dir)
+
+	def test_keyset_condition(self):
+		self.assertEqual(
+			keyset_condition(("creation", "name")),
+			"((`creation` > %(after_0)s) OR (`creation` = %(after_0)s AND `name` > %(after_1)s))"
+		)
+
+	def test_keyset_pagination_across_equal_creation(self):
+		# Chunks end in the middle of runs of equal creation values
+		rows = [
+			{"name": f"NOTE-{i:03d}", "creation": f"2025-01-0{1 + i // 4} 00:00:00"}
+			for i in range(10)
+		]
+		with patch("frappe.db", SQLiteDB(rows)):
+			chunks = list(iter_chunks("Note", chunk_size=3, keys=("creation", "name")))
+
+		self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 3, 1])
+		self.assertEqual([row["name"] for chunk in chunks for row in chunk], [row["name"] for row in rows])
+
+	def test_compact_chunk_round_trip(self):
+		rows = [
+			{"name": "P-1", "title": "One", "child_tables": {"Item": [
+				{"name": "c1", "parent": "P-1", "qty": 1},
+				{"name": "c2", "parent": "P-1", "qty": 2}
+			]}},
+			{"name": "P-2", "title": None, "child_tables": {"Item": []}},
+			{"name": "P-3", "extra": 3, "child_tables": {"Item": [{"name": "c3", "parent": "P-3", "qty": 3}]}}
+		]
+		decoded = decode_chunk(encode_chunk(rows, ["Item"]))
+
+		# Columns missing from a row come back as None
+		expected = [{"title": None, "extra": None, **row} for row in rows]
+		self.assertEqual(decoded, expected)
+
+	def test_writer_checksum(self):
+		rows = [{"name": f"DOC-{i}", "value": i} for i in range(100)]
+		for compression, filename in (("none", "rows.ndjson"), ("gzip", "rows.ndjson.gz")):
+			path = os.path.join(self.backup_dir, filename)
+			with BackupWriter(path, compression) as writer:
+				for row in rows:
+					writer.write(row)
+
+			with open(path, "rb") as f:
+				data = f.read()
+			self.assertEqual(writer.checksum, {"sha256": hashlib.sha256(data).hexdigest(), "bytes": len(data)})
+			self.assertEqual(writer.checksum["sha256"], file_checksum(path))
+			self.assertEqual(writer.rows, 100)
+			self.assertEqual(list(iter_backup_rows(path)), rows)
+
+		with gzip.open(os.path.join(self.backup_dir, "rows.ndjson.gz"), "rt") as compressed, \
+				open(os.path.join(self.backup_dir, "rows.ndjson")) as plain:
+			self.assertEqual(compressed.read(), plain.read())
+
+	def test_json_list_writer(self):
+		path = os.path.join(self.backup_dir, "rows.json")
+		with BackupWriter(path, array=True) as writer:
+			writer.write({"name": "A"})
+			writer.write({"name": "B"})
+
+		self.assertEqual(list(iter_backup_rows(path)), [{"name": "A"}, {"name": "B"}])
+		self.assertEqual(list(iter_backup_rows(path, names=["B"])), [{"name": "B"}])
+
+	def test_compact_backup_name_filter(self):
+		directory = os.path.join(self.backup_dir, "Note.compact")
+		os.makedirs(directory)
+
+		chunks, names = [], {}
+		for position, rows in enumerate([
+			[{"name": 1, "child_tables": {}}, {"name": 2, "child_tables": {}}],
+			[{"name": 3, "child_tables": {}}]
+		]):
+			filename = f"chunk-{position + 1:06d}.json.gz"
+			with BackupWriter(os.path.join(directory, filename), "gzip") as writer:
+				writer.write(encode_chunk(rows, []))
+			chunks.append(filename)
+			names.update((row["name"], position) for row in rows)
+
+		index = os.path.join(directory, "index.json.gz")
+		with BackupWriter(index, "gzip") as writer:
+			writer.write({"doctype": "Note", "chunks": chunks, "names": names})
+
+		self.assertEqual([row["name"] for row in iter_backup_rows(index)], [1, 2, 3])
+		# Integer names are matched through the string keys of the JSON index
+		self.assertEqual([row["name"] for row in iter_backup_rows(index, names=[3, "2"])], [2, 3])
+		self.assertEqual(list(iter_backup_rows(index, names=["missing"])), [])
@@ -0,0 +1,234 @@
+# Copyright (c) 2025, Agnikul Cosmos Private Limited and Contributors
+# See license.txt
+
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+from frappe.tests.utils import FrappeTestCase
+
+from core.commands.backup_utils import (
+	BackupWriter, get_backup_chain, insert_documents, iter_backup_rows, read_manifest, write_manifest
+)
+from core.commands.restore_app import apply_incremental, restore_documents
+
+SCHEMA = {
+	"Note": ["name TEXT PRIMARY KEY", "title TEXT"],
+	"Note Item": ["name TEXT PRIMARY KEY", "parent TEXT", "parenttype TEXT", "parentfield TEXT", "code TEXT UNIQUE"]
+}
+
+
+class SQLiteDB:
+	"""The part of frappe.db used by the restore helpers, on SQLite, logging every statement."""
+
+	def __init__(self, schema=SCHEMA):
+		self.connection = sqlite3.connect(":memory:")
+		self.connection.row_factory = sqlite3.Row
+		self.statements = []
+		for doctype, columns in schema.items():
+			self.connection.execute(f"CREATE TABLE `tab{doctype}` ({', '.join(columns)})")
+
+	def sql(self, query, params=None, as_dict=False):
+		self.statements.append(" ".join(query.split()))
+		if query.strip().startswith("SET SESSION"):
+			return []
+
+		if isinstance(params, dict):
+			# Expand tuple parameters of `IN %(names)s` into one placeholder per value
+			flat = {}
+			for key, value in params.items():
+				if isinstance(value, (tuple, list)):
+					flat.update((f"{key}_{i}", item) for i, item in enumerate(value))
+				else:
+					flat[key] = value
+
+			def placeholder(match):
+				key = match.group(1)
+				if isinstance(params[key], (tuple, list)):
+					return "(" + ", ".join(f":{key}_{i}" for i in range(len(params[key]))) + ")"
+				return f":{key}"
+
+			query, params = re.sub(r"%\((\w+)\)s", placeholder, query), flat
+		else:
+			query = query.replace("%s", "?")
+
+		rows = self.connection.execute(query, params or ())
+		return [dict(row) for row in rows] if as_dict else [tuple(row) for row in rows]
+
+	def get_table_columns(self, doctype):
+		return [row["name"] for row in self.connection.execute(f"PRAGMA table_info(`tab{doctype}`)")]
+
+	def commit(self):
+		self.connection.commit()
+
+	def rows(self, doctype):
+		return sorted(tuple(row) for row in self.connection.execute(f"SELECT * FROM `tab{doctype}`"))
+
+
+def note(name, *codes, title=None):
+	"""Backed up Note document with one Note Item per code."""
+	return {
+		"name": name,
+		"title": title or name,
+		"child_tables": {"Note Item": [
+			{"name": f"{name}-{code}", "parent": name, "parenttype": "Note", "parentfield": "items", "code": code}
+			for code in codes
+		]}
+	}
+
+
+class TestRestoreChildren(FrappeTestCase):
+	def setUp(self):
+		self.db = SQLiteDB()
+		patcher = patch("frappe.db", self.db)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def test_failed_parent_leaves_no_child_rows(self):
+		self.db.sql("INSERT INTO `tabNote` VALUES ('N-1', 'existing')")
+		errors = []
+
+		inserted, counts = insert_documents(
+			"Note", [note("N-1", "A"), note("N-2", "B")], ["Note Item"],
+			on_error=lambda row, error: errors.append(row["name"])
+		)
+
+		self.assertEqual(inserted, 1)
+		self.assertEqual(counts, {"Note Item": 1})
+		self.assertEqual(errors, ["N-1"])
+		self.assertEqual(self.db.rows("Note Item"), [("N-2-B", "N-2", "Note", "items", "B")])
+
+	def test_bulk_load_only_covers_parent_rows(self):
+		insert_documents("Note", [note("N-1", "A")], ["Note Item"], bulk_load=True)
+
+		statements = [
+			statement.split(" (")[0] for statement in self.db.statements
+			if statement.startswith(("SET SESSION unique_checks", "INSERT"))
+		]
+		self.assertEqual(statements, [
+			"SET SESSION unique_checks = 0",
+			"INSERT INTO `tabNote`",
+			"SET SESSION unique_checks = 1",
+			"INSERT INTO `tabNote Item`"
+		])
+
+	def test_child_unique_index_is_enforced(self):
+		# Rows of another parent already use the code, the restored row must not slip in
+		self.db.sql("INSERT INTO `tabNote Item` VALUES ('X-1', 'X', 'Other', 'items', 'A')")
+		errors = []
+
+		insert_documents(
+			"Note", [note("N-1", "A")], ["Note Item"], bulk_load=True,
+			on_error=lambda row, error: errors.append(row["name"])
+		)
+
+		self.assertEqual(errors, ["N-1-A"])
+		self.assertEqual(self.db.rows("Note"), [("N-1", "N-1")])
+
+	def test_replace_swaps_child_rows(self):
+		restore_documents([note("N-1", "A", "B"), note("N-2", "C")], "Note", child_tables=["Note Item"])
+
+		child_counts = {}
+		restored = restore_documents(
+			[note("N-1", "D", title="changed")], "Note", replace=True,
+			child_tables=["Note Item"], child_counts=child_counts
+		)
+
+		self.assertEqual(restored, 1)
+		self.assertEqual(child_counts, {"Note Item": 1})
+		self.assertEqual(self.db.rows("Note"), [("N-1", "changed"), ("N-2", "N-2")])
+		self.assertEqual(sorted(row[4] for row in self.db.rows("Note Item")), ["C", "D"])
+
+
+class TestRestoreChain(FrappeTestCase):
+	def setUp(self):
+		self.app_dir = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.app_dir)
+		self.db = SQLiteDB()
+		patcher = patch("frappe.db", self.db)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def backup(self, name, docs, parent=None, deleted=None):
+		"""Write a Note backup directory with its manifest, incremental when it has a parent."""
+		backup_dir = os.path.join(self.app_dir, name)
+		os.makedirs(backup_dir)
+		entry = self.write(backup_dir, "Note.ndjson", docs)
+		if deleted is not None:
+			entry["deleted"] = self.write(backup_dir, "Note.deleted.ndjson", deleted)
+
+		manifest = {"type": "incremental" if parent else "full", "doctypes": {"Note": entry}}
+		if parent:
+			manifest["parent"] = parent
+		write_manifest(backup_dir, manifest)
+		return backup_dir
+
+	def write(self, backup_dir, filename, rows):
+		with BackupWriter(os.path.join(backup_dir, filename)) as writer:
+			for row in rows:
+				writer.write(row)
+		return {"file": filename, "rows": writer.rows, **writer.checksum}
+
+	def replay(self, backup_dir):
+		"""Restore the chain of `backup_dir` the way restore-app does."""
+		for step, chain_dir in enumerate(get_backup_chain(backup_dir)):
+			entry = read_manifest(chain_dir)["doctypes"]["Note"]
+			docs = list(iter_backup_rows(os.path.join(chain_dir, entry["file"])))
+			if step == 0:
+				restore_documents(docs, "Note", child_tables=["Note Item"], bulk_load=True)
+				continue
+			deleted = entry.get("deleted")
+			deleted_names = list(iter_backup_rows(os.path.join(chain_dir, deleted["file"]))) if deleted else []
+			apply_incremental(docs, "Note", deleted_names, child_tables=["Note Item"])
+
+	def test_chain_order(self):
+		full = self.backup("20250101-000000", [])
+		first = self.backup("20250102-000000", [], parent="20250101-000000", deleted=[])
+		second = self.backup("20250103-000000", [], parent="20250102-000000", deleted=[])
+		# A later, unrelated full backup is not part of the chain
+		self.backup("20250104-000000", [])
+
+		self.assertEqual(get_backup_chain(second), [full, first, second])
+		self.assertEqual(get_backup_chain(full), [full])
+
+	def test_missing_parent(self):
+		self.backup("20250101-000000", [])
+		incremental = self.backup("20250103-000000", [], parent="20250102-000000", deleted=[])
+
+		with self.assertRaises(ValueError):
+			get_backup_chain(incremental)
+
+	def test_replay_applies_updates_and_deletions(self):
+		self.backup("20250101-000000", [note("N-1", "A"), note("N-2", "B"), note("N-3", "C")])
+		self.backup(
+			"20250102-000000", [note("N-1", "A", "D", title="edited"), note("N-4", "E")],
+			parent="20250101-000000", deleted=["N-2"]
+		)
+		last = self.backup(
+			"20250103-000000", [note("N-2", "B", title="recreated")],
+			parent="20250102-000000", deleted=["N-3"]
+		)
+
+		self.replay(last)
+
+		self.assertEqual(self.db.rows("Note"), [("N-1", "edited"), ("N-2", "recreated"), ("N-4", "N-4")])
+		self.assertEqual(
+			sorted((row[1], row[4]) for row in self.db.rows("Note Item")),
+			[("N-1", "A"), ("N-1", "D"), ("N-2", "B"), ("N-4", "E")]
+		)
+
+	def test_replay_is_idempotent(self):
+		# Incremental windows overlap, so the same change can arrive in two backups
+		self.backup("20250101-000000", [note("N-1", "A")])
+		self.backup("20250102-000000", [note("N-1", "B", title="edited")], parent="20250101-000000", deleted=[])
+		last = self.backup(
+			"20250103-000000", [note("N-1", "B", title="edited")], parent="20250102-000000", deleted=["N-9"]
+		)
+
+		self.replay(last)
+
+		self.assertEqual(self.db.rows("Note"), [("N-1", "edited")])
+		self.assertEqual(self.db.rows("Note Item"), [("N-1-B", "N-1", "Note", "items", "B")])
@@ -0,0 +1,58 @@
+from __future__ import unicode_literals, absolute_import
+import os
+import sys
+import click
+from concurrent.futures import ThreadPoolExecutor
+from termcolor import colored
+from core.commands.backup_utils import file_checksum, manifest_files, read_manifest
+
+def verify_file(backup_dir, entry):
+    """None when the file matches its manifest entry, otherwise the problem."""
+    path = os.path.join(backup_dir, entry["file"])
+    if not os.path.exists(path):
+        return "missing"
+    if os.path.getsize(path) != entry["bytes"]:
+        return f"size {os.path.getsize(path)} != {entry['bytes']}"
+    if file_checksum(path) != entry["sha256"]:
+        return "checksum mismatch"
+    return None
+
+@click.command('verify-backup')
+@click.argument('backup_path', type=str)
+@click.option('--jobs', default=os.cpu_count() or 1, type=click.IntRange(min=1), help='Number of files checked in parallel (default: number of CPUs).')
+def verify_backup(backup_path, jobs):
+    """
+    Verify the files of a backup against the checksums in its manifest.
+
+    This command:
+    - Reads manifest.json of a backup-app backup or a compact backup-doctype backup.
+    - Checks the size and sha256 checksum of every data, names, deleted, chunk and index file in parallel.
+    - Exits with status 1 when any file is missing or does not match.
+
+    Examples:
+    \b
+    - bench verify-backup backup/core/20250217-160622
+    - bench verify-backup backup/core/20250217-160622 --jobs 8
+    """
+    manifest = read_manifest(backup_path)
+    if not manifest:
+        click.echo(colored(f"Error: No manifest.json found in '{backup_path}'.", 'black', 'on_red'))
+        sys.exit(1)
+
+    entries = list(manifest_files(manifest))
+
+    # Hashing releases the GIL, so threads read and hash files concurrently
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(lambda entry: verify_file(backup_path, entry), entries))
+
+    failures = [(entry["file"], problem) for entry, problem in zip(entries, results) if problem]
+    for filename, problem in failures:
+        click.echo(colored(f"{filename}: {problem}", 'black', 'on_red'))
+
+    if failures:
+        click.echo(colored(f"Verification failed for {len(failures)} of {len(entries)} files in {backup_path}", 'black', 'on_red'))
+        sys.exit(1)
+
+    click.echo(colored(f"Verified {len(entries)} files in {backup_path}", 'black', 'on_green'))
+
+commands = [verify_backup]
@@ -14,18 +14,40 @@ after_migrate = "core.sync_handler.clear_sync_cache"
 
 doc_events = {
     "AGK_Projects": {
-        "before_save": "core.api.pl_role.assign"
+        "on_update": ["core.api.masters.invalidate", "core.utils.clear_approver_directory", "core.api.roles.reconcile_doc"],
+        "after_rename": ["core.api.masters.invalidate", "core.utils.clear_approver_directory"],
+        "on_trash": ["core.api.masters.invalidate", "core.utils.clear_approver_directory"],
+        "after_delete": "core.api.roles.reconcile_doc"
     },
     "AGK_Departments": {
-        "before_save": "core.api.dl_role.assign"
+        "on_update": ["core.api.masters.invalidate", "core.utils.clear_approver_directory", "core.api.roles.reconcile_doc"],
+        "after_rename": ["core.api.masters.invalidate", "core.utils.clear_approver_directory"],
+        "on_trash": ["core.api.masters.invalidate", "core.utils.clear_approver_directory"],
+        "after_delete": "core.api.roles.reconcile_doc"
     },
     "AGK_ERP_Products": {
         "before_insert": "core.api.products.create",
-        "before_save": "core.api.products.assign"
+        "on_update": ["core.clear_module_cache", "core.utils.clear_approver_directory", "core.api.roles.reconcile_doc"],
+        "after_rename": ["core.clear_module_cache", "core.utils.clear_approver_directory"],
+        "on_trash": ["core.clear_module_cache", "core.utils.clear_approver_directory"],
+        "after_delete": "core.api.roles.reconcile_doc"
+    },
+    "AGK_MIS": {
+        "on_update": ["core.api.mis.clear_cache", "core.api.masters.invalidate"],
+        "after_rename": ["core.api.mis.clear_cache", "core.api.masters.invalidate"],
+        "on_trash": ["core.api.mis.clear_cache", "core.api.masters.invalidate"]
+    },
+    "AGK_Rigs": {
+        "on_update": "core.api.masters.invalidate",
+        "after_rename": "core.api.masters.invalidate",
+        "on_trash": "core.api.masters.invalidate"
     },
     "AGK_Facilities": {
         "before_insert": "core.api.facility.security",
-        "validate": "core.api.facility.validate_status"
+        "validate": "core.api.facility.validate_status",
+        "on_update": "core.api.masters.invalidate",
+        "after_rename": "core.api.masters.invalidate",
+        "on_trash": "core.api.masters.invalidate"
     },
 
     "Desk Settings":{
@@ -34,7 +56,18 @@ doc_events = {
     "Employee": {
         "before_validate": "core.api.employee.before_validate",
         "validate": "core.api.employee.validate_user_status",
-        "before_save": "core.api.employee.before_save"
+        "before_save": "core.api.employee.before_save",
+        "on_update": "core.clear_session_cache",
+        "on_trash": "core.clear_session_cache"
+    },
+    "User": {
+        "on_update": ["core.clear_session_cache", "core.invalidate_user_cache"],
+        "on_trash": ["core.clear_session_cache", "core.invalidate_user_cache"]
+    },
+
+    "Attendance_Records": {
+        "on_update": "core.utils.clear_on_leave",
+        "on_trash": "core.utils.clear_on_leave"
     },
 
     "Has Role": {
@@ -47,6 +80,11 @@ doc_events = {
         "on_trash":  "core.invalidate_user_cache",
     },
 
+    "Custom DocPerm": {
+        "on_update": "core.invalidate_user_cache",
+        "on_trash":  "core.invalidate_user_cache",
+    },
+
     "*": {
         "on_update": "core.sync_handler.process_doc_event", 
         "on_trash": "core.sync_handler.process_doc_event"
@@ -0,0 +1,151 @@
+"""
+Counters for generated document names and codes, kept in `tabSeries`.
+
+A counter is one row, advanced with a single `UPDATE ... LAST_INSERT_ID()` so
+concurrent inserts never read the same value. Missing rows are seeded once from
+the data that already exists, so counters pick up where the old lookups left off.
+"""
+
+import re
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import now_datetime
+
+def next_value(key, count=1, seed=None):
+    """
+    Reserve `count` consecutive values of the counter `key`, returns the first one.
+    `seed` is called when the counter does not exist yet and returns the highest value in use.
+    """
+    if not frappe.db.sql("SELECT 1 FROM `tabSeries` WHERE name = %s", key):
+        current = seed() if seed else 0
+        frappe.db.sql(
+            "INSERT IGNORE INTO `tabSeries` (name, current) VALUES (%s, %s)",
+            (key, current or 0)
+        )
+
+    frappe.db.sql(
+        "UPDATE `tabSeries` SET current = LAST_INSERT_ID(current + %s) WHERE name = %s",
+        (count, key)
+    )
+    last = frappe.db.sql("SELECT LAST_INSERT_ID()")[0][0]
+    return last - count + 1
+
+def set_value(key, value):
+    """Move the counter `key` to `value`, creating it when missing."""
+    frappe.db.sql("""
+        INSERT INTO `tabSeries` (name, current) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE current = VALUES(current)
+    """, (key, value))
+
+def parse_format(series_format, date=None):
+    """
+    Split a series format like "PV_MMYY_####" into its dated prefix and counter width.
+    Returns ("PV_1026", 4) for October 2026.
+    """
+    series_prefix = series_format.replace("MMYY", (date or now_datetime()).strftime("%m%y"))
+
+    match = re.match(r"(.+?)_#+$", series_prefix)
+    if not match:
+        frappe.throw("Invalid series format. Use format like 'PV_MMYY_####'.")
+
+    return match.group(1), series_prefix.count("#")
+
+def name_key(doctype, prefix):
+    return f"{doctype}:{prefix}_"
+
+def max_name_counter(doctype, prefix):
+    """Highest counter among existing `{prefix}_####` names of `doctype`."""
+    like_pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "\\_%"
+    result = frappe.db.sql(f"""
+        SELECT MAX(CAST(SUBSTRING(name, %(start)s) AS UNSIGNED))
+        FROM `tab{doctype}`
+        WHERE name LIKE %(pattern)s AND SUBSTRING(name, %(start)s) REGEXP '^[0-9]+$'
+    """, {"start": len(prefix) + 2, "pattern": like_pattern})
+    return result[0][0] or 0
+
+def next_names(doctype, series_format, count=1):
+    """
+    Allocate `count` names of `doctype` for the series format in one counter update.
+    Names handed out by an open `preallocate` block are used first.
+    """
+    prefix, width = parse_format(series_format)
+    key = name_key(doctype, prefix)
+
+    names = []
+    block = getattr(frappe.local, "series_blocks", {}).get(key)
+    while block and len(names) < count:
+        names.append(block.pop(0))
+
+    remaining = count - len(names)
+    if remaining:
+        first = next_value(key, remaining, seed=lambda: max_name_counter(doctype, prefix))
+        names += [f"{prefix}_{str(counter).zfill(width)}" for counter in range(first, first + remaining)]
+
+    return names
+
+@contextmanager
+def preallocate(doctype, series_format, count):
+    """
+    Reserve a block of `count` names up front for bulk imports, so each insert
+    inside the block takes its name from memory instead of the counter row.
+    Unused names of the block are skipped, leaving a gap in the series.
+    """
+    prefix, width = parse_format(series_format)
+    key = name_key(doctype, prefix)
+
+    if not hasattr(frappe.local, "series_blocks"):
+        frappe.local.series_blocks = {}
+
+    frappe.local.series_blocks[key] = next_names(doctype, series_format, count)
+    try:
+        yield
+    finally:
+        frappe.local.series_blocks.pop(key, None)
+
+# Generated codes: sequence -> (doctype, field, prefix, width)
+CODE_SEQUENCES = {
+    "facility_code": ("AGK_Facilities", "facility_code", "F", 4),
+    "project_code": ("Project Detail", "code", "P", 4),
+}
+
+def code_key(sequence):
+    doctype, field, prefix, width = CODE_SEQUENCES[sequence]
+    return f"{doctype}:{field}"
+
+def max_code_counter(sequence):
+    """Highest counter among the existing codes of a sequence, like 42 for "P0042"."""
+    doctype, field, prefix, width = CODE_SEQUENCES[sequence]
+    result = frappe.db.sql(f"""
+        SELECT MAX(CAST(SUBSTRING(`{field}`, %(start)s) AS UNSIGNED))
+        FROM `tab{doctype}`
+        WHERE `{field}` REGEXP %(pattern)s
+    """, {"start": len(prefix) + 1, "pattern": f"^{re.escape(prefix)}[0-9]+$"})
+    return result[0][0] or 0
+
+def next_codes(sequence, count=1):
+    """Reserve `count` consecutive codes of a sequence, like ["P0042", "P0043"], in one counter update."""
+    doctype, field, prefix, width = CODE_SEQUENCES[sequence]
+    first = next_value(code_key(sequence), count, seed=lambda: max_code_counter(sequence))
+    return [f"{prefix}{str(counter).zfill(width)}" for counter in range(first, first + count)]
+
+def repair_sequences(reset=False):
+    """
+    Reconcile the code counters with existing data.
+    Counters behind the highest code in use are moved forward. With `reset`, counters
+    ahead of it (gaps left by rolled back inserts) are moved back as well.
+    Returns {sequence: (counter before, counter after)}.
+    """
+    report = {}
+    for sequence in CODE_SEQUENCES:
+        key = code_key(sequence)
+        in_use = max_code_counter(sequence)
+        current = frappe.db.sql("SELECT current FROM `tabSeries` WHERE name = %s FOR UPDATE", key)
+        current = current[0][0] if current else None
+
+        target = in_use if reset or current is None else max(current, in_use)
+        if target != current:
+            set_value(key, target)
+        report[sequence] = (current, target)
+
+    return report
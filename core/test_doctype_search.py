@@ -0,0 +1,35 @@
+# Copyright (c) 2025, Agnikul Cosmos Private Limited and Contributors
+# See license.txt
+
+from frappe.tests.utils import FrappeTestCase
+
+from core import _build_doctype_index, _search_doctype_index
+
+
+class TestDoctypeSearch(FrappeTestCase):
+	def setUp(self):
+		self.index = _build_doctype_index([
+			"Sales Order", "Order", "Purchase Order", "Orders Log", "Work_Order Item", "Reorder Level", "User"
+		])
+
+	def test_ranking(self):
+		# Exact, then prefix, then word prefix, then substring matches, shorter names first
+		self.assertEqual(_search_doctype_index(self.index, "order", 10), [
+			"Order",
+			"Orders Log",
+			"Sales Order",
+			"Purchase Order",
+			"Work_Order Item",
+			"Reorder Level"
+		])
+
+	def test_case_and_whitespace(self):
+		self.assertEqual(_search_doctype_index(self.index, "  USER ", 10), ["User"])
+
+	def test_longer_than_prefix_index(self):
+		self.assertEqual(_search_doctype_index(self.index, "orders", 10), ["Orders Log"])
+
+	def test_limit_and_empty_query(self):
+		self.assertEqual(_search_doctype_index(self.index, "order", 2), ["Order", "Orders Log"])
+		self.assertEqual(_search_doctype_index(self.index, "", 3), ["Sales Order", "Order", "Purchase Order"])
+		self.assertEqual(_search_doctype_index(self.index, "invoice", 10), [])
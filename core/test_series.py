@@ -0,0 +1,140 @@
+# Copyright (c) 2025, Agnikul Cosmos Private Limited and Contributors
+# See license.txt
+
+import re
+import sqlite3
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from core.series import (
+	code_key, next_codes, next_names, next_value, parse_format, preallocate, repair_sequences, set_value
+)
+
+
+class SQLiteDB:
+	"""
+	`tabSeries` and the tables counters are seeded from, on SQLite. The MariaDB
+	statements of core.series are translated, with LAST_INSERT_ID(expr) kept per connection.
+	"""
+
+	def __init__(self, tables):
+		self.connection = sqlite3.connect(":memory:")
+		self.connection.execute("CREATE TABLE `tabSeries` (name TEXT PRIMARY KEY, current INTEGER)")
+		for table, (column, values) in tables.items():
+			self.connection.execute(f"CREATE TABLE `tab{table}` (`{column}` TEXT)")
+			self.connection.executemany(f"INSERT INTO `tab{table}` VALUES (?)", [(value,) for value in values])
+
+		self.last_insert_id = 0
+		self.connection.create_function("LAST_INSERT_ID", -1, self.set_last_insert_id)
+		self.connection.create_function(
+			"REGEXP", 2, lambda pattern, value: value is not None and re.search(pattern, value) is not None
+		)
+		self.statements = []
+
+	def set_last_insert_id(self, *value):
+		if value:
+			self.last_insert_id = value[0]
+		return self.last_insert_id
+
+	def sql(self, query, params=None):
+		self.statements.append(" ".join(query.split()))
+		query = (
+			query.replace("INSERT IGNORE", "INSERT OR IGNORE")
+			.replace("ON DUPLICATE KEY UPDATE current = VALUES(current)", "ON CONFLICT(name) DO UPDATE SET current = excluded.current")
+			.replace(" FOR UPDATE", "")
+			.replace("LIKE %(pattern)s", "LIKE %(pattern)s ESCAPE '\\'")
+		)
+		query = re.sub(r"%\((\w+)\)s", r":\1", query).replace("%s", "?")
+		if isinstance(params, str):
+			params = (params,)
+		return [tuple(row) for row in self.connection.execute(query, params or ())]
+
+	def counter(self, key):
+		row = self.connection.execute("SELECT current FROM `tabSeries` WHERE name = ?", (key,)).fetchone()
+		return row[0] if row else None
+
+
+class TestSeries(FrappeTestCase):
+	def setUp(self):
+		self.db = SQLiteDB({"Note": ("name", [
+			"PV_1026_0007", "PV_1026_0012", "PV_1026_draft", "PVX1026_0099", "PV_0926_0050"
+		])})
+		for patcher in (patch("frappe.db", self.db), patch("core.series.now_datetime", return_value=datetime(2026, 10, 1))):
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+	def test_next_value_reserves_consecutive_blocks(self):
+		seed = MagicMock(return_value=41)
+
+		self.assertEqual(next_value("key", seed=seed), 42)
+		self.assertEqual(next_value("key", 3, seed=seed), 43)
+		self.assertEqual(next_value("key", seed=seed), 46)
+		# Seeded once, when the counter row was created
+		seed.assert_called_once()
+		self.assertEqual(self.db.counter("key"), 46)
+
+	def test_next_value_without_seed(self):
+		self.assertEqual(next_value("key", 2), 1)
+		self.assertEqual(next_value("key"), 3)
+
+	def test_parse_format(self):
+		self.assertEqual(parse_format("PV_MMYY_####"), ("PV_1026", 4))
+		self.assertEqual(parse_format("PV_MMYY_##", datetime(2025, 2, 1)), ("PV_0225", 2))
+		with self.assertRaises(frappe.ValidationError):
+			parse_format("PV_MMYY")
+
+	def test_next_names_continue_existing_names(self):
+		# Only names of this month's prefix with a numeric counter count
+		self.assertEqual(next_names("Note", "PV_MMYY_####", 2), ["PV_1026_0013", "PV_1026_0014"])
+		self.assertEqual(next_names("Note", "PV_MMYY_####"), ["PV_1026_0015"])
+		self.assertEqual(self.db.counter("Note:PV_1026_"), 15)
+
+	def test_preallocate(self):
+		with preallocate("Note", "PV_MMYY_####", 3):
+			statements = len(self.db.statements)
+			self.assertEqual(next_names("Note", "PV_MMYY_####"), ["PV_1026_0013"])
+			# Names of the block come from memory
+			self.assertEqual(len(self.db.statements), statements)
+			# Past the end of the block, the counter is used again
+			self.assertEqual(
+				next_names("Note", "PV_MMYY_####", 3), ["PV_1026_0014", "PV_1026_0015", "PV_1026_0016"]
+			)
+
+		# The block is closed, unused names are skipped
+		with preallocate("Note", "PV_MMYY_####", 2):
+			pass
+		self.assertEqual(next_names("Note", "PV_MMYY_####"), ["PV_1026_0019"])
+		self.assertNotIn("Note:PV_1026_", frappe.local.series_blocks)
+
+
+class TestCodeSequences(FrappeTestCase):
+	def setUp(self):
+		self.db = SQLiteDB({
+			"Project Detail": ("code", ["P0007", "P0041", "PX12", "P12A", None]),
+			"AGK_Facilities": ("facility_code", ["F0003"])
+		})
+		patcher = patch("frappe.db", self.db)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def test_next_codes_continue_existing_codes(self):
+		self.assertEqual(next_codes("project_code", 2), ["P0042", "P0043"])
+		self.assertEqual(next_codes("project_code"), ["P0044"])
+		self.assertEqual(next_codes("facility_code"), ["F0004"])
+
+	def test_repair_moves_counters_forward(self):
+		set_value(code_key("project_code"), 10)
+
+		self.assertEqual(repair_sequences(), {"facility_code": (None, 3), "project_code": (10, 41)})
+		self.assertEqual(next_codes("project_code"), ["P0042"])
+
+	def test_repair_keeps_gaps_unless_reset(self):
+		set_value(code_key("project_code"), 50)
+		set_value(code_key("facility_code"), 3)
+
+		self.assertEqual(repair_sequences(), {"facility_code": (3, 3), "project_code": (50, 50)})
+		self.assertEqual(repair_sequences(reset=True), {"facility_code": (3, 3), "project_code": (50, 41)})
+		self.assertEqual(self.db.counter(code_key("project_code")), 41)
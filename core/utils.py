@@ -1,11 +1,15 @@
 import functools
 import frappe
-from typing import Callable, Dict, List, Any, Optional, Union
+from typing import Callable, Dict, List, Any, Optional
+from collections import Counter
 import hashlib
-import json
+import re
+import threading
 import time
 from datetime import date
 
+PROFILE_KEY_PREFIX = "core_profile"
+
 def paginate():
 
     def decorator(func: Callable) -> Callable:
@@ -139,53 +143,367 @@ def rate_limit(time_window: int = 5):
         return wrapper
     return decorator
 
-@frappe.whitelist()
-def approver(id):
-    # Projects: combine primary + proxy
-    projects = frappe.db.sql("""
-        (
-            SELECT pd.name1 AS name, 'primary' AS role
-            FROM `tabAGK_Projects` p
-            JOIN `tabProject Detail` pd ON pd.parent = p.name
-            WHERE p.status = 'Active' AND p.primary_approver = %(id)s
-        )
-        UNION ALL
-        (
-            SELECT pd.name1 AS name, 'proxy' AS role
-            FROM `tabAGK_Projects` p
-            JOIN `tabProject Detail` pd ON pd.parent = p.name
-            WHERE p.status = 'Active' AND p.proxy_approver = %(id)s
-        )
-    """, {"id": id}, as_dict=True)
-
-    # Departments: combine primary + proxy
-    departments = frappe.db.sql("""
-        (
-            SELECT department_name AS name, 'primary' AS role
-            FROM `tabAGK_Departments`
-            WHERE primary_approver = %(id)s
+
+def get_counter(name: str) -> int:
+    """
+    Read a monotonically increasing counter kept in Redis.
+
+    A missing counter is seeded with the current time in milliseconds, so values
+    keep increasing even after the cache is flushed.
+    """
+    cache = frappe.cache()
+    key = cache.make_key(name)
+    value = cache.get(key)
+    if value is None:
+        cache.set(key, int(time.time() * 1000), nx=True)
+        value = cache.get(key)
+    return int(value)
+
+
+def bump_counter(name: str) -> int:
+    """Atomically increment a counter created by `get_counter` and return the new value."""
+    get_counter(name)
+    cache = frappe.cache()
+    return int(cache.incr(cache.make_key(name)))
+
+
+def not_modified(etag: str) -> bool:
+    """
+    Send `etag` with the response and report whether the client already has it.
+
+    When this returns True the caller should return None; the response goes out
+    as 304 Not Modified.
+    """
+    headers = getattr(frappe.local, "response_headers", None)
+    if headers is not None:
+        headers["ETag"] = etag
+
+    if frappe.get_request_header("If-None-Match") == etag:
+        frappe.local.response["http_status_code"] = 304
+        return True
+    return False
+
+
+def profile(endpoint: Optional[str] = None):
+    """
+    Opt-in profiler for whitelisted methods.
+
+    Enabled with `core_profiling: 1` in site config. Each call records SQL statement
+    count, DB time, Redis calls and wall time, and flags N+1 patterns (the same
+    normalized query repeated more than `core_profiling_n_plus_one` times, default 5).
+    Results are aggregated in Redis per endpoint, see `profile_report`.
+    """
+    def decorator(func: Callable) -> Callable:
+        name = endpoint or f"{func.__module__}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs) -> Any:
+            # Nested profiled calls are counted by the outermost one
+            if not frappe.conf.get("core_profiling") or getattr(frappe.local, "core_profile", None) is not None:
+                return func(*args, **kwargs)
+
+            # frappe.db is the request's own connection, patching it does not affect other threads
+            db = frappe.db
+            original_sql = db.sql
+            state = frappe.local.core_profile = {"queries": [], "redis_calls": 0}
+
+            def traced_sql(query, *sql_args, **sql_kwargs):
+                started = time.perf_counter()
+                try:
+                    return original_sql(query, *sql_args, **sql_kwargs)
+                finally:
+                    state["queries"].append((query, time.perf_counter() - started))
+
+            _trace_redis(frappe.cache())
+            db.sql = traced_sql
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                wall_time = time.perf_counter() - started
+                db.sql = original_sql
+                frappe.local.core_profile = None
+
+                try:
+                    _record_profile(name, state["queries"], state["redis_calls"], wall_time)
+                except Exception:
+                    # Profiling must never break the profiled endpoint
+                    frappe.logger("core.profiler").exception(f"Could not record profile for {name}")
+
+        return wrapper
+    return decorator
+
+
+_redis_trace_lock = threading.Lock()
+
+def _trace_redis(cache) -> None:
+    """
+    Count Redis commands into the current request's profile. The Redis client is
+    shared by every thread of the worker, so it is wrapped once and never restored;
+    requests without an active profile pass straight through.
+    """
+    with _redis_trace_lock:
+        if getattr(cache, "_core_profile_traced", False):
+            return
+        original_execute = cache.execute_command
+
+        def traced_execute(*redis_args, **redis_kwargs):
+            state = getattr(frappe.local, "core_profile", None)
+            if state is not None:
+                state["redis_calls"] += 1
+            return original_execute(*redis_args, **redis_kwargs)
+
+        cache.execute_command = traced_execute
+        cache._core_profile_traced = True
+
+
+def _normalize_query(query) -> str:
+    """Strip literals from a query so repeated statements group together."""
+    query = str(query)
+    query = re.sub(r"'(?:[^'\\]|\\.)*'", "?", query)
+    query = re.sub(r"\b\d+(?:\.\d+)?\b", "?", query)
+    query = re.sub(r"\(\s*\?(?:\s*,\s*\?)*\s*\)", "(?)", query)
+    return re.sub(r"\s+", " ", query).strip()
+
+
+def _record_profile(endpoint: str, queries: List, redis_calls: int, wall_time: float) -> None:
+    threshold = int(frappe.conf.get("core_profiling_n_plus_one") or 5)
+    repeated = Counter(_normalize_query(query) for query, _ in queries)
+    suspects = {query: count for query, count in repeated.items() if count > threshold}
+    db_time = sum(duration for _, duration in queries)
+
+    cache = frappe.cache()
+    stats_key = cache.make_key(f"{PROFILE_KEY_PREFIX}:{endpoint}")
+    suspects_key = cache.make_key(f"{PROFILE_KEY_PREFIX}:n_plus_one:{endpoint}")
+
+    pipe = cache.pipeline()
+    pipe.sadd(cache.make_key(f"{PROFILE_KEY_PREFIX}:endpoints"), endpoint)
+    pipe.hincrby(stats_key, "calls", 1)
+    pipe.hincrby(stats_key, "queries", len(queries))
+    pipe.hincrby(stats_key, "redis_calls", redis_calls)
+    pipe.hincrbyfloat(stats_key, "db_time", db_time)
+    pipe.hincrbyfloat(stats_key, "wall_time", wall_time)
+    if suspects:
+        pipe.hincrby(stats_key, "n_plus_one_calls", 1)
+        for query, count in suspects.items():
+            pipe.hincrby(suspects_key, query, count)
+    pipe.execute()
+
+    if suspects:
+        frappe.logger("core.profiler").warning(
+            f"Possible N+1 in {endpoint}: " + "; ".join(f"{count}x {query}" for query, count in suspects.items())
         )
-        UNION ALL
-        (
-            SELECT department_name AS name, 'proxy' AS role
-            FROM `tabAGK_Departments`
-            WHERE proxy_approver = %(id)s
+
+
+@frappe.whitelist()
+def profile_report(reset=0):
+    """Per-endpoint averages collected by the `profile` decorator."""
+    frappe.only_for("System Manager")
+
+    cache = frappe.cache()
+    endpoints_key = cache.make_key(f"{PROFILE_KEY_PREFIX}:endpoints")
+
+    def decode(value):
+        return value.decode() if isinstance(value, bytes) else value
+
+    def read(command, key):
+        # Keys are already prefixed and values are raw counters, so bypass
+        # RedisWrapper's make_key / pickle handling like _record_profile does
+        pipe = cache.pipeline()
+        getattr(pipe, command)(key)
+        return pipe.execute()[0]
+
+    report = []
+    for endpoint in sorted(decode(e) for e in read("smembers", endpoints_key)):
+        stats_key = cache.make_key(f"{PROFILE_KEY_PREFIX}:{endpoint}")
+        suspects_key = cache.make_key(f"{PROFILE_KEY_PREFIX}:n_plus_one:{endpoint}")
+
+        stats = {decode(k): float(v) for k, v in read("hgetall", stats_key).items()}
+        calls = int(stats.get("calls", 0)) or 1
+        suspects = sorted(
+            ({"query": decode(q), "count": int(c)} for q, c in read("hgetall", suspects_key).items()),
+            key=lambda s: s["count"],
+            reverse=True
         )
-    """, {"id": id}, as_dict=True)
-
-    # Group by role for response formatting
-    def group_by_role(data):
-        grouped = {"primary": [], "proxy": []}
-        for row in data:
-            grouped[row.role].append(row.name)
-        return grouped
-
-    return {
-        "projects": group_by_role(projects),
-        "departments": group_by_role(departments)
+
+        report.append({
+            "endpoint": endpoint,
+            "calls": int(stats.get("calls", 0)),
+            "avg_queries": round(stats.get("queries", 0) / calls, 2),
+            "avg_db_time_ms": round(stats.get("db_time", 0) * 1000 / calls, 2),
+            "avg_redis_calls": round(stats.get("redis_calls", 0) / calls, 2),
+            "avg_wall_time_ms": round(stats.get("wall_time", 0) * 1000 / calls, 2),
+            "n_plus_one_calls": int(stats.get("n_plus_one_calls", 0)),
+            "n_plus_one_queries": suspects[:10]
+        })
+
+        if int(reset):
+            cache.delete(stats_key, suspects_key)
+
+    if int(reset):
+        cache.delete(endpoints_key)
+
+    # Worst offenders first
+    return sorted(report, key=lambda r: r["avg_queries"], reverse=True)
+
+APPROVER_DIRECTORY_VERSION_KEY = "approver_directory_version"
+LEAVE_STATUSES = {"Casual Leave", "Sick Leave", "Maternity Leave", "Paternity Leave", "Festival Leave"}
+
+# Approver directory of this worker per site as (version, directory), shared read-only
+# by the site's requests, like `_desk_settings`
+_approver_directories = {}
+
+def get_approver_directory() -> Dict[str, Any]:
+    """
+    Approver lookups materialized from AGK_Projects, AGK_Departments and AGK_ERP_Products.
+
+    - project_details: Project Detail name1 -> (primary, proxy, project status)
+    - project_codes: Project Detail code -> (primary, proxy, project status), preferring
+      an Active project when a code is used by several
+    - departments: department_name -> (primary, proxy)
+    - modules: module_name -> (primary_fl, proxy_fl)
+    - users: approver -> {"projects": {...}, "departments": {...}} as returned by `approver`
+
+    Cached until one of those doctypes is written. Workers keep the directory in memory
+    and only go back to Redis (and the database on a miss) when the version changes.
+    Callers must not modify it.
+    """
+    version = get_counter(APPROVER_DIRECTORY_VERSION_KEY)
+    cached = _approver_directories.get(frappe.local.site)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    cache = frappe.cache()
+    cache_key = f"approver_directory:{version}"
+
+    directory = cache.get_value(cache_key)
+    if directory is not None:
+        _approver_directories[frappe.local.site] = (version, directory)
+        return directory
+
+    directory = {"project_details": {}, "project_codes": {}, "departments": {}, "modules": {}, "users": {}}
+
+    def user_entry(user):
+        return directory["users"].setdefault(user, {
+            "projects": {"primary": [], "proxy": []},
+            "departments": {"primary": [], "proxy": []}
+        })
+
+    projects = frappe.db.sql("""
+        SELECT pd.name1, pd.code, p.status, p.primary_approver, p.proxy_approver
+        FROM `tabAGK_Projects` p
+        JOIN `tabProject Detail` pd ON pd.parent = p.name
+        ORDER BY pd.creation
+    """, as_dict=True)
+    for row in projects:
+        approvers = (row.primary_approver, row.proxy_approver, row.status)
+        directory["project_details"].setdefault(row.name1, approvers)
+        # Codes can be duplicated, an older inactive project must not hide the active one
+        current = directory["project_codes"].get(row.code)
+        if current is None or (row.status == "Active" and current[2] != "Active"):
+            directory["project_codes"][row.code] = approvers
+        if row.status == "Active":
+            if row.primary_approver:
+                user_entry(row.primary_approver)["projects"]["primary"].append(row.name1)
+            if row.proxy_approver:
+                user_entry(row.proxy_approver)["projects"]["proxy"].append(row.name1)
+
+    departments = frappe.get_all(
+        "AGK_Departments",
+        fields=["department_name", "primary_approver", "proxy_approver"]
+    )
+    for row in departments:
+        directory["departments"].setdefault(row.department_name, (row.primary_approver, row.proxy_approver))
+        if row.primary_approver:
+            user_entry(row.primary_approver)["departments"]["primary"].append(row.department_name)
+        if row.proxy_approver:
+            user_entry(row.proxy_approver)["departments"]["proxy"].append(row.department_name)
+
+    products = frappe.get_all("AGK_ERP_Products", fields=["module_name", "primary_fl", "proxy_fl"])
+    for row in products:
+        directory["modules"].setdefault(row.module_name, (row.primary_fl, row.proxy_fl))
+
+    cache.set_value(cache_key, directory, expires_in_sec=24 * 60 * 60)
+    _approver_directories[frappe.local.site] = (version, directory)
+    return directory
+
+def clear_approver_directory(doc, method=None):
+    """Doc event hook: rebuild the approver directory after the write is committed."""
+    frappe.db.after_commit.add(lambda: bump_counter(APPROVER_DIRECTORY_VERSION_KEY))
+
+def get_on_leave(day: Optional[str] = None) -> set:
+    """Emails of employees on leave on `day` (default today), one query per day."""
+    day = day or date.today().strftime("%Y-%m-%d")
+    cache = frappe.cache()
+    cache_key = f"approvers_on_leave:{day}"
+
+    on_leave = cache.get_value(cache_key)
+    if on_leave is None:
+        on_leave = set(frappe.get_all(
+            "Attendance_Records",
+            filters={"date": day, "status": ["in", list(LEAVE_STATUSES)]},
+            pluck="employee_email"
+        ))
+        cache.set_value(cache_key, on_leave, expires_in_sec=24 * 60 * 60)
+
+    return on_leave
+
+def clear_on_leave(doc, method=None):
+    """Attendance_Records hook: recompute the on-leave set of that day."""
+    day = str(doc.get("date") or "")[:10]
+    if day:
+        frappe.db.after_commit.add(lambda: frappe.cache().delete_value(f"approvers_on_leave:{day}"))
+
+@frappe.whitelist()
+@profile()
+def approver(id):
+    # Projects and departments where the user is primary or proxy approver
+    empty = {
+        "projects": {"primary": [], "proxy": []},
+        "departments": {"primary": [], "proxy": []}
     }
+    return get_approver_directory()["users"].get(id, empty)
+
+@frappe.whitelist()
+@profile()
+def batch_approvers(codes=None, departments=None, modules=None):
+    """
+    Approvers for many project codes, department names and module names in one call.
+    Unknown keys (or inactive projects) map to None. `approvers` is the leave-aware
+    routing list that `get_leads` returns.
+    """
+    directory = get_approver_directory()
+
+    def resolve(primary, proxy):
+        return {
+            "primary_approver": primary,
+            "proxy_approver": proxy,
+            "approvers": filter_approvers(primary, proxy)
+        }
+
+    def as_list(values):
+        # parse_json returns non-JSON input such as codes=P001 unchanged
+        values = frappe.parse_json(values)
+        return [values] if isinstance(values, str) else values or []
+
+    result = {"projects": {}, "departments": {}, "modules": {}}
+
+    for code in as_list(codes):
+        project = directory["project_codes"].get(code)
+        result["projects"][code] = resolve(*project[:2]) if project and project[2] == "Active" else None
+
+    for department_name in as_list(departments):
+        department = directory["departments"].get(department_name)
+        result["departments"][department_name] = resolve(*department) if department else None
+
+    for module_name in as_list(modules):
+        module = directory["modules"].get(module_name)
+        result["modules"][module_name] = resolve(*module) if module else None
+
+    return result
 
 @frappe.whitelist()
+@profile()
 @paginate()
 def get_employees(dept=None, query=None, start=0, limit=20):
 
@@ -216,6 +534,7 @@ def get_employees(dept=None, query=None, start=0, limit=20):
 
 
 @frappe.whitelist()
+@profile()
 def get_leads(pro=None, app=None):
     approvers = {
         "pro_approvers": [],
@@ -234,37 +553,19 @@ def get_leads(pro=None, app=None):
 
 def validate_pro_or_app(category, value):
     primary, proxy = None, None
+    directory = get_approver_directory()
 
     if category == "pro":
-        # Step 1: Check in AGK_Departments
-        department = frappe.get_all("AGK_Departments",
-                                    filters={"department_name": value},
-                                    fields=["primary_approver", "proxy_approver"],
-                                    limit=1)
-        if department:
-            primary, proxy = department[0]["primary_approver"], department[0]["proxy_approver"]
-        else:
-            # Step 2: Check in Project Detail child table
-            project_detail = frappe.get_all("Project Detail",
-                                            filters={"name1": value},
-                                            fields=["parent"],
-                                            limit=1)
-            if project_detail:
-                project = frappe.get_all("AGK_Projects",
-                                         filters={"name": project_detail[0]["parent"]},
-                                         fields=["primary_approver", "proxy_approver"],
-                                         limit=1)
-                if project:
-                    primary, proxy = project[0]["primary_approver"], project[0]["proxy_approver"]
+        # Step 1: Check in AGK_Departments, Step 2: Check in Project Detail child table
+        if value in directory["departments"]:
+            primary, proxy = directory["departments"][value]
+        elif value in directory["project_details"]:
+            primary, proxy, _ = directory["project_details"][value]
 
     elif category == "app":
-        # Step 1: Check in AGK_ERP_Products
-        product = frappe.get_all("AGK_ERP_Products",
-                                 filters={"module_name": value},
-                                 fields=["primary_fl", "proxy_fl"],
-                                 limit=1)
-        if product:
-            primary, proxy = product[0]["primary_fl"], product[0]["proxy_fl"]
+        # Check in AGK_ERP_Products
+        if value in directory["modules"]:
+            primary, proxy = directory["modules"][value]
 
     return filter_approvers(primary, proxy)
 
@@ -272,16 +573,8 @@ def filter_approvers(primary, proxy):
     if not primary:
         return []
 
-    today = date.today().strftime("%Y-%m-%d")
-    leave_statuses = {"Casual Leave", "Sick Leave", "Maternity Leave", "Paternity Leave", "Festival Leave"}
-
-    # Fetch attendance status in one query
-    attendance = frappe.get_all("Attendance_Records",
-                                filters={"employee_email": primary, "date": today},
-                                fields=["status"],
-                                limit=1)
-
-    if attendance and attendance[0]["status"] in leave_statuses:
+    # Route to the proxy as well while the primary approver is on leave
+    if primary in get_on_leave():
         return [primary, proxy] if proxy else [primary]
 
     return [primary]